@@ -1,8 +1,45 @@
+import asyncio
+import os
 import re
-from typing import List, Tuple, Any
+import string
+from functools import lru_cache
+from io import BytesIO
+from typing import AsyncIterator, BinaryIO, Iterable, List, Tuple, Any, Union
 from fastapi.datastructures import UploadFile
 from ..models.files import FileNode
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# 1 MB in binary
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# AES-GCM recommended nonce size, in bytes
+AESGCM_NONCE_SIZE = 12
+
+# Size of the chunks read when encrypting a file with AES-GCM, 64 KB
+ENCRYPT_CHUNK_SIZE = 64 * 1024
+
+# Maximum number of files written at once by write_files
+DEFAULT_MAX_CONCURRENCY = 2 * (os.cpu_count() or 1)
+
+# Maximum number of sanitized paths and file names remembered by each store
+SANITIZE_CACHE_SIZE = 2048
+
+# Characters allowed by default in sanitized paths and file names, compiled once for all the stores
+DEFAULT_SANITIZATION_REGEX = re.compile(r'^[\w/ .()\[\]:\-\'<>?]+$')
+
+# '..' path component, i.e. directory traversal
+_PARENT_COMPONENT = re.compile(r'(?:^|/)\.\.(?:/|\Z)')
+
+# Translation table deleting the newline and carriage-return characters from paths and file names
+_CONTROL_CHARACTERS = str.maketrans("", "", "\n\r")
+
+# ASCII characters allowed by the default regex: when deleting them from a value leaves nothing,
+# the value is valid without running the regex
+_DEFAULT_ALLOWED_ASCII = (string.ascii_letters + string.digits + "_/ .()[]:-'<>?").encode("ascii")
 
 class FilesStore:
   """
@@ -10,10 +47,36 @@ class FilesStore:
   over different storage backends such as S3 or local file system.
   """
   
-  def __init__(self, key: bytes = None):
-    """Initialize the files service."""
-    self.fernet = Fernet(key) if key else None
-    self.sanitization_regex = re.compile(r'^[\w/ .()\[\]:\-\'<>?]+$')
+  def __init__(self, key: Union[bytes, Fernet] = None, use_aesgcm: bool = False):
+    """Initialize the files service.
+
+    Args:
+        key (bytes or Fernet, optional): The encryption key, or a Fernet cipher to share between stores.
+            Defaults to None (no encryption).
+        use_aesgcm (bool, optional): Whether to encrypt with AES-GCM instead of Fernet. The AES key is
+            derived from the provided key, which must then be bytes. Defaults to False.
+
+    Raises:
+        ValueError: If AES-GCM encryption is requested with a Fernet cipher.
+        ValueError: If the Fernet key is invalid.
+    """
+    if use_aesgcm and isinstance(key, Fernet):
+      raise ValueError("AES-GCM encryption requires a key, not a Fernet cipher")
+    # Ciphers are built once, here, so that an invalid key fails fast
+    self.fernet: Fernet = None
+    self.aesgcm: AESGCM = None
+    self._aes = None
+    if key and use_aesgcm:
+      aes_key = self._derive_aesgcm_key(key)
+      # Keep the AES algorithm as well, for the chunked encryption of files
+      self._aes = algorithms.AES(aes_key)
+      self.aesgcm = AESGCM(aes_key)
+    elif key:
+      self.fernet = key if isinstance(key, Fernet) else Fernet(key)
+    # Sanitization is pure for a given regex, so its results are cached until the regex changes
+    self._sanitized_paths = lru_cache(maxsize=SANITIZE_CACHE_SIZE)(self._sanitize_path)
+    self._sanitized_file_names = lru_cache(maxsize=SANITIZE_CACHE_SIZE)(self._sanitize_file_name)
+    self.sanitization_regex = DEFAULT_SANITIZATION_REGEX
     self.meta_extension = ".meta.json"
   
   async def write_file(self, upload_file: UploadFile, folder: str = "") -> FileNode:
@@ -28,6 +91,25 @@ class FilesStore:
     """
     pass
 
+  async def write_files(self, upload_files: List[UploadFile], folder: str = "", max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[FileNode]:
+    """Write several uploaded files to the specified folder, concurrently.
+
+    Args:
+        upload_files (List[UploadFile]): The uploaded files to write.
+        folder (str, optional): The folder to write the files to. Defaults to "".
+        max_concurrency (int, optional): The maximum number of files written at once. Defaults to DEFAULT_MAX_CONCURRENCY.
+    
+    Returns:
+        List[FileNode]: The uploaded file nodes, in the same order as the uploaded files.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def write(upload_file: UploadFile) -> FileNode:
+      async with semaphore:
+        return await self.write_file(upload_file, folder)
+
+    return await asyncio.gather(*[write(upload_file) for upload_file in upload_files])
+
   async def write_local_file(self, file_path: str, folder: str = "") -> FileNode:
     """Write a local file to the specified folder.
 
@@ -51,6 +133,21 @@ class FilesStore:
     """
     pass
 
+  async def iter_file(self, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Iterate over the file content in chunks, e.g. to stream it in a response.
+
+    Args:
+        file_path (str): Path of the file in the storage backend.
+        chunk_size (int, optional): The maximum size of each chunk. Defaults to 1 MB.
+
+    Yields:
+        bytes: The next chunk of the (decrypted) file content.
+    """
+    content, _ = await self.get_file(file_path)
+    view = memoryview(content)
+    for offset in range(0, len(view), chunk_size):
+      yield bytes(view[offset:offset + chunk_size])
+
   async def list_files(self, folder: str, recursive: bool = False) -> List[FileNode]:
     """List the files in the specified folder.
 
@@ -109,19 +206,65 @@ class FilesStore:
     """
     pass
   
+  @property
+  def is_encrypted(self) -> bool:
+    """Whether the file content is encrypted in the storage backend."""
+    return self.fernet is not None or self.aesgcm is not None
+
+  def _derive_aesgcm_key(self, key: bytes) -> bytes:
+    """Derive a 256-bit AES key from the provided encryption key.
+
+    Args:
+        key (bytes): The encryption key.
+
+    Returns:
+        bytes: The AES key.
+    """
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"enacit4r_files aesgcm")
+    return hkdf.derive(key)
+
   def encrypt_content(self, content: bytes) -> bytes:
     """Encrypt file content, if encryption is enabled.
+    With AES-GCM, the encrypted content is the nonce followed by the ciphertext and its tag.
 
     Args:
         content (bytes): The file content to encrypt.
     Returns:
         bytes: The encrypted content.
     """
+    if self.aesgcm:
+      nonce = os.urandom(AESGCM_NONCE_SIZE)
+      return nonce + self.aesgcm.encrypt(nonce, content, None)
     if not self.fernet:
       return content
     encrypted_content = self.fernet.encrypt(content)
     return encrypted_content
   
+  def encrypt_file(self, file: BinaryIO, chunk_size: int = ENCRYPT_CHUNK_SIZE) -> BytesIO:
+    """Encrypt the content of a file object from its current position, if encryption is enabled.
+    With AES-GCM, the file is encrypted chunk by chunk, without loading the plain content in memory.
+    The result is the same as with :meth:`encrypt_content`.
+
+    Args:
+        file (BinaryIO): The file object to encrypt.
+        chunk_size (int, optional): The size of the chunks read from the file. Defaults to 64 KB.
+
+    Returns:
+        BytesIO: The encrypted content, positioned at its start.
+    """
+    if not self.aesgcm:
+      return BytesIO(self.encrypt_content(file.read()))
+    nonce = os.urandom(AESGCM_NONCE_SIZE)
+    encryptor = Cipher(self._aes, modes.GCM(nonce)).encryptor()
+    encrypted = BytesIO()
+    encrypted.write(nonce)
+    while chunk := file.read(chunk_size):
+      encrypted.write(encryptor.update(chunk))
+    encrypted.write(encryptor.finalize())
+    encrypted.write(encryptor.tag)
+    encrypted.seek(0)
+    return encrypted
+
   def decrypt_content(self, encrypted_content: bytes) -> bytes:
     """Decrypt file content, if encryption is enabled.
 
@@ -131,11 +274,25 @@ class FilesStore:
     Returns:
         bytes: The decrypted content.
     """
+    if self.aesgcm:
+      view = memoryview(encrypted_content)
+      return self.aesgcm.decrypt(view[:AESGCM_NONCE_SIZE], view[AESGCM_NONCE_SIZE:], None)
     if not self.fernet:
       return encrypted_content
     decrypted_content = self.fernet.decrypt(encrypted_content)
     return decrypted_content
 
+  @property
+  def sanitization_regex(self) -> re.Pattern:
+    """The compiled regex that sanitized paths and file names must match."""
+    return self._sanitization_regex
+
+  @sanitization_regex.setter
+  def sanitization_regex(self, regex: re.Pattern):
+    self._sanitization_regex = regex
+    self._sanitized_paths.cache_clear()
+    self._sanitized_file_names.cache_clear()
+
   def set_sanitization_regex(self, pattern: str):
     """Set a custom regex pattern for path sanitization.
 
@@ -150,17 +307,36 @@ class FilesStore:
     except re.error as exc:
       raise ValueError(f"Invalid sanitization regex pattern: {pattern!r}") from exc
 
+  def _has_allowed_characters(self, value: str) -> bool:
+    """Check that a path or file name only contains the characters allowed by ``self.sanitization_regex``.
+    With the default regex, pure ASCII values are checked on their bytes with a single translation
+    instead of the regex.
+
+    Args:
+        value (str): The value to check.
+
+    Returns:
+        bool: True if all the characters are allowed, False otherwise.
+    """
+    # Read the regex once, the property is looked up on every access
+    regex = self._sanitization_regex
+    # isascii() only reads a flag of the string, non-ASCII letters are left to the regex
+    if regex is DEFAULT_SANITIZATION_REGEX and value.isascii():
+      if not value.encode("ascii").translate(None, _DEFAULT_ALLOWED_ASCII):
+        return True
+    return regex.match(value) is not None
+
   def sanitize_path(self, path: str) -> str:
     """Sanitize a file path string to prevent directory traversal and reject unsafe characters.
     This method performs the following steps:
-    * Removes all leading forward slashes (``/``) from the path.
     * Removes all newline (``\\n``) and carriage-return (``\\r``) characters from the path.
+    * Removes all leading and trailing forward slashes (``/``) from the path.
     * Rejects paths containing the substring ``".."`` to avoid directory traversal.
     * Validates the resulting (possibly empty) path against ``self.sanitization_regex`` when it is
       non-empty. By default, the allowed characters are those matched by the pattern
-      ``^[a-zA-Z0-9/ _.()\\[\\]:-]+$`` (letters, digits, forward slashes, spaces, underscores,
-      periods, parentheses, square brackets, colons, and hyphens), but this pattern can be
-      customized via :meth:`set_sanitization_regex`.
+      ``^[\\w/ .()\\[\\]:\\-'<>?]+$`` (letters including accented ones, digits, underscores, forward
+      slashes, spaces, periods, parentheses, square brackets, colons, hyphens, apostrophes, angle
+      brackets and question marks), but this pattern can be customized via :meth:`set_sanitization_regex`.
     Args:
         path (str): The raw path string to sanitize.
     Raises:
@@ -175,18 +351,50 @@ class FilesStore:
     # Check for None input
     if path is None:
         raise ValueError("Invalid path: path cannot be None")
-    # Remove leading/trailing slashes
-    path = path.strip("/")
-    # Remove \n and \r characters
-    path = path.replace("\n", "").replace("\r", "")
+    # Nothing to sanitize in an empty path
+    if not path:
+        return path
+    return self._sanitized_paths(path)
+
+  def _sanitize_path(self, path: str) -> str:
+    """Sanitize a non-empty file path string, see :meth:`sanitize_path`.
+
+    Args:
+        path (str): The raw path string to sanitize.
+
+    Returns:
+        str: The sanitized path string.
+    """
+    # Remove \n and \r characters, then leading/trailing slashes
+    path = path.translate(_CONTROL_CHARACTERS).strip("/")
     # Check for '..' as a path component (directory traversal)
-    # Split by '/' and check if any component is exactly '..'
-    if any(component == ".." for component in path.split("/")):
+    # Search for a component that is exactly '..', only when the path contains one
+    if ".." in path and _PARENT_COMPONENT.search(path):
         raise ValueError("Invalid path: '..' not allowed")
-    if path and not self.sanitization_regex.match(path):
+    if path and not self._has_allowed_characters(path):
         raise ValueError("Invalid path: contains forbidden characters")
     return path
 
+  def sanitize_paths(self, paths: Iterable[str]) -> List[str]:
+    """Sanitize several file path strings, e.g. the paths of a batch of files.
+
+    Args:
+        paths (Iterable[str]): The raw path strings to sanitize.
+
+    Raises:
+        ValueError: If any of the paths is invalid, see :meth:`sanitize_path`.
+
+    Returns:
+        List[str]: The sanitized path strings, in the same order.
+    """
+    sanitized_paths = self._sanitized_paths
+    sanitized = []
+    for path in paths:
+      if path is None:
+        raise ValueError("Invalid path: path cannot be None")
+      sanitized.append(sanitized_paths(path) if path else path)
+    return sanitized
+
   def sanitize_file_name(self, file_name: str) -> str:
     """Sanitize only the file name part of a path.
 
@@ -203,10 +411,24 @@ class FilesStore:
     # Check for None input
     if file_name is None:
         raise ValueError("Invalid file name: file name cannot be None")
+    # Nothing to sanitize in an empty file name
+    if not file_name:
+        return file_name
+    return self._sanitized_file_names(file_name)
+
+  def _sanitize_file_name(self, file_name: str) -> str:
+    """Sanitize a non-empty file name, see :meth:`sanitize_file_name`.
+
+    Args:
+        file_name (str): The raw file name string to sanitize.
+
+    Returns:
+        str: The sanitized file name.
+    """
     # Remove \n and \r characters
-    file_name = file_name.replace("\n", "").replace("\r", "")
+    file_name = file_name.translate(_CONTROL_CHARACTERS)
     # Allow empty file names
-    if file_name and not self.sanitization_regex.match(file_name):
+    if file_name and not self._has_allowed_characters(file_name):
         raise ValueError("Invalid file name: contains forbidden characters")
     # Do not allow path separators in file names
     if "/" in file_name:
@@ -1,84 +1,290 @@
-from typing import List, Tuple, Any
+from typing import AsyncIterator, List, Tuple, Any, Union
 from fastapi.datastructures import UploadFile
+from cryptography.fernet import Fernet
 from ..models.files import FileNode
-from .files import FilesStore
+from .files import FilesStore, DEFAULT_CHUNK_SIZE
+from ..utils.files import guess_mime_type
+import asyncio
+import errno
 import logging
+import os
+import re
 import shutil
-import mimetypes
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from stat import S_ISREG
+
+# Maximum number of file nodes kept in memory by a local store
+NODE_CACHE_SIZE = 4096
+
+# Suffix of the temporary files used for atomic writes
+TMP_SUFFIX = ".tmp-"
+
 
 class LocalFilesStore(FilesStore):
   """
   This service provides file-related operations on the local file system.
   """
   
-  def __init__(self, base_path: str = ".", key: bytes = None):
+  def __init__(self, base_path: str = ".", key: Union[bytes, Fernet] = None, use_aesgcm: bool = False, durable: bool = False):
     """Initialize the local files service with a base path.
     
     Args:
         base_path (str): The base path for file operations. Defaults to current directory.
-        key (bytes, optional): The encryption key. Defaults to None.
+        key (bytes or Fernet, optional): The encryption key, or a Fernet cipher. Defaults to None.
+        use_aesgcm (bool, optional): Whether to encrypt with AES-GCM instead of Fernet. Defaults to False.
+        durable (bool, optional): Whether to flush written files to disk (fsync) before returning. Defaults to False.
     """
-    super().__init__(key=key)
+    super().__init__(key=key, use_aesgcm=use_aesgcm)
     self.base_path = Path(base_path).resolve()
     self.base_path.mkdir(parents=True, exist_ok=True)
+    self._base_str = os.path.join(str(self.base_path), "")
+    self.durable = durable
+    self._node_cache: OrderedDict[str, Tuple[Tuple[int, int], FileNode]] = OrderedDict()
+    self._node_cache_lock = threading.Lock()
+    self._known_dirs: set[str] = set()
+    # Temporary metadata files written by _atomic_write_bytes, user files may contain the suffix
+    self._tmp_meta_pattern = re.compile(re.escape(self.meta_extension + TMP_SUFFIX) + r"\d+-\d+$")
   
-  def _get_full_path(self, path: str) -> Path:
+  def _get_full_path(self, path: str) -> str:
     """Get the full path by joining with base path.
     
     Args:
         path (str): The relative path.
         
     Returns:
-        Path: The full resolved path.
+        str: The full normalized path.
     """
     path = self.sanitize_path(path)
-    full_path = (self.base_path / path).resolve()
+    # Pure string normalization, base_path is resolved once at init
+    full_path = os.path.normpath(os.path.join(self._base_str, path))
     # Ensure the path is within base_path (security check)
-    if hasattr(full_path, "is_relative_to"):
-      if not full_path.is_relative_to(self.base_path):
-        raise ValueError(f"Path {path} is outside the base path")
-    else:
-      try:
-        full_path.relative_to(self.base_path)
-      except ValueError:
-        raise ValueError(f"Path {path} is outside the base path")
+    if not (full_path + os.sep).startswith(self._base_str):
+      raise ValueError(f"Path {path} is outside the base path")
     return full_path
   
-  def _dump_file_node(self, file_node: FileNode, file_path: Path):
+  def _get_rel_path(self, full_path: str) -> str:
+    """Get the path relative to the base path, with forward slashes.
+
+    Args:
+        full_path (str): The full path, within the base path.
+
+    Returns:
+        str: The relative path.
+    """
+    return full_path[len(self._base_str):].replace(os.sep, "/")
+  
+  def _get_meta_path(self, file_path: str) -> str:
+    """Get the path of the metadata file associated with a file.
+
+    Args:
+        file_path (str): The path to the reference file.
+
+    Returns:
+        str: The path to the metadata file.
+    """
+    return f"{file_path}{self.meta_extension}"
+  
+  def _ensure_dir(self, dir_path: str):
+    """Create a directory and its parents, unless it is already known to exist.
+
+    Args:
+        dir_path (str): The path to the directory.
+    """
+    if dir_path in self._known_dirs:
+      return
+    os.makedirs(dir_path, exist_ok=True)
+    # Parent folders exist as well, up to the base path (without trailing separator)
+    while dir_path not in self._known_dirs and len(dir_path) >= len(self._base_str) - 1:
+      self._known_dirs.add(dir_path)
+      dir_path = os.path.dirname(dir_path)
+  
+  def _in_dir(self, dir_path: str, operation, *args):
+    """Run a file operation in a directory, creating it first unless it is already known to exist.
+    If the directory was removed since, e.g. by another store, it is created again and the
+    operation is retried once.
+
+    Args:
+        dir_path (str): The path to the directory.
+        operation (Callable): The file operation.
+        *args: The arguments of the file operation.
+
+    Returns:
+        Any: The result of the file operation.
+    """
+    self._ensure_dir(dir_path)
+    try:
+      return operation(*args)
+    except FileNotFoundError:
+      if os.path.isdir(dir_path):
+        raise
+      self._forget_dirs(dir_path)
+      self._ensure_dir(dir_path)
+      return operation(*args)
+  
+  def _forget_dirs(self, dir_path: str):
+    """Forget that a directory, and all its subdirectories, exist.
+
+    Args:
+        dir_path (str): The path to the directory.
+    """
+    prefix = os.path.join(dir_path, "")
+    # Iterate over a copy, folders may be added meanwhile by writes in worker threads
+    self._known_dirs -= {k for k in list(self._known_dirs) if k == dir_path or k.startswith(prefix)}
+  
+  def _dump_file_node(self, file_node: FileNode, file_path: str):
     """Dump a FileNode to a JSON file.
 
     Args:
         file_node (FileNode): The file node to dump.
-        file_path (Path): The path to the reference file.
+        file_path (str): The path to the reference file.
+    """
+    json_path = self._get_meta_path(file_path)
+    stat = self._atomic_write_bytes(json_path, file_node.model_dump_json().encode("utf-8"))
+    self._cache_file_node(file_path, file_node, stat)
+  
+  def _write_bytes(self, file_path: str, content: bytes):
+    """Write binary content to a file, flushed to disk if durability is enabled.
+
+    Args:
+        file_path (str): The path to the file.
+        content (bytes): The content to write.
+    """
+    with open(file_path, "wb") as f:
+      f.write(content)
+      if self.durable:
+        f.flush()
+        os.fsync(f.fileno())
+  
+  def _atomic_write_bytes(self, file_path: str, content: bytes) -> os.stat_result:
+    """Write binary content to a temporary file and rename it over the target file,
+    so that readers never see a partially written file.
+
+    Args:
+        file_path (str): The path to the file.
+        content (bytes): The content to write.
+
+    Returns:
+        os.stat_result: The stats of the written file.
     """
-    json_path = file_path.with_suffix(file_path.suffix + self.meta_extension)
-    with open(json_path, "w") as f:
-      f.write(file_node.model_dump_json())
+    tmp_path = f"{file_path}{TMP_SUFFIX}{os.getpid()}-{threading.get_ident()}"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    try:
+      view = memoryview(content)
+      while view:
+        view = view[os.write(fd, view):]
+      if self.durable:
+        os.fsync(fd)
+      # Inode and modification time are kept by the rename
+      stat = os.fstat(fd)
+    except BaseException:
+      os.close(fd)
+      os.unlink(tmp_path)
+      raise
+    os.close(fd)
+    os.replace(tmp_path, file_path)
+    return stat
+  
+  def _sync_file(self, file_path: str):
+    """Flush a file to disk, if durability is enabled.
+
+    Args:
+        file_path (str): The path to the file.
+    """
+    if not self.durable:
+      return
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+      os.fsync(fd)
+    finally:
+      os.close(fd)
   
-  def _read_file_node(self, file_path: Path) -> FileNode:
-    """Read a FileNode from a JSON file.
+  def _read_file_node(self, file_path: str) -> FileNode:
+    """Read a FileNode from a JSON file. The metadata file is parsed only if it
+    has changed since it was last written or read by this store. If there is no
+    metadata file, or if it is empty, the node is built from the file stats.
 
     Args:
-        file_path (Path): The path to the reference file.
+        file_path (str): The path to the reference file.
     Returns:
         FileNode: The loaded file node.
     """
-    json_path = file_path.with_suffix(file_path.suffix + self.meta_extension)
-    with open(json_path, "r") as f:
+    file_path = os.fspath(file_path)
+    json_path = self._get_meta_path(file_path)
+    try:
+      stat = os.stat(json_path)
+    except FileNotFoundError:
+      stat = None
+    if stat is None or stat.st_size == 0:
+      return self._stat_file_node(file_path)
+    with self._node_cache_lock:
+      cached = self._node_cache.get(file_path)
+      if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_ino):
+        self._node_cache.move_to_end(file_path)
+        return cached[1].model_copy()
+    with open(json_path, "rb", buffering=0) as f:
       json_content = f.read()
     file_node = FileNode.model_validate_json(json_content)
+    self._cache_file_node(file_path, file_node, stat)
     return file_node
   
-  def _delete_file_node(self, file_path: Path):
+  def _stat_file_node(self, file_path: str, stat: os.stat_result = None) -> FileNode:
+    """Build a FileNode from the file stats, for files without metadata.
+
+    Args:
+        file_path (str): The path to the file.
+        stat (os.stat_result, optional): The file stats, if already known. Defaults to None.
+    Returns:
+        FileNode: The file node. The size is unknown if the file is encrypted.
+    """
+    if stat is None:
+      stat = os.stat(file_path)
+    file_name = os.path.basename(file_path)
+    return FileNode(
+      name=file_name,
+      path=self._get_rel_path(file_path),
+      size=None if self.is_encrypted else stat.st_size,
+      mime_type=guess_mime_type(file_name),
+      is_file=S_ISREG(stat.st_mode)
+    )
+  
+  def _cache_file_node(self, file_path: str, file_node: FileNode, stat: os.stat_result):
+    """Keep a copy of the last written or read FileNode of a file, to spare metadata file parsing.
+
+    Args:
+        file_path (str): The path to the reference file.
+        file_node (FileNode): The file node.
+        stat (os.stat_result): The stats of the metadata file the node was written to or read from.
+    """
+    with self._node_cache_lock:
+      self._node_cache[file_path] = ((stat.st_mtime_ns, stat.st_ino), file_node.model_copy())
+      self._node_cache.move_to_end(file_path)
+      if len(self._node_cache) > NODE_CACHE_SIZE:
+        self._node_cache.popitem(last=False)
+  
+  def _forget_file_nodes(self, file_path: str):
+    """Remove the cached FileNode of a file, or of all the files of a directory.
+
+    Args:
+        file_path (str): The path to the file or directory.
+    """
+    prefix = os.path.join(file_path, "")
+    with self._node_cache_lock:
+      for cached_key in [k for k in self._node_cache if k == file_path or k.startswith(prefix)]:
+        del self._node_cache[cached_key]
+  
+  def _delete_file_node(self, file_path: str):
     """Delete the metadata file associated with a file.
 
     Args:
-        file_path (Path): The path to the reference file.
+        file_path (str): The path to the reference file.
     """
-    json_path = file_path.with_suffix(file_path.suffix + self.meta_extension)
-    if json_path.exists():
-      json_path.unlink()
+    self._forget_file_nodes(file_path)
+    try:
+      os.unlink(self._get_meta_path(file_path))
+    except FileNotFoundError:
+      pass
   
   async def write_file(self, upload_file: UploadFile, folder: str = "") -> FileNode:
     """Write an uploaded file to the specified folder.
@@ -90,33 +296,45 @@ class LocalFilesStore(FilesStore):
     Returns:
         FileNode: The written file node.
     """
-    # Create the target directory
     target_dir = self._get_full_path(folder)
-    target_dir.mkdir(parents=True, exist_ok=True)
     
     # Create the full file path
     file_name = self.sanitize_file_name(upload_file.filename)
-    file_path = target_dir / file_name
+    file_path = os.path.join(target_dir, file_name)
     
     # Read the file content
     content = await upload_file.read()
     
+    # Blocking file I/O runs in a worker thread, so that concurrent uploads overlap,
+    # in the target directory which is created if needed
+    return await asyncio.to_thread(self._in_dir, target_dir, self._write_content, content, file_path, file_name)
+  
+  def _write_content(self, content: bytes, file_path: str, file_name: str) -> FileNode:
+    """Write content to a file and dump its metadata.
+
+    Args:
+        content (bytes): The file content, before encryption.
+        file_path (str): The path to the file.
+        file_name (str): The name of the file.
+
+    Returns:
+        FileNode: The written file node.
+    """
     # Get file stats from the original content (before encryption)
     size = len(content)
-    mime_type, _ = mimetypes.guess_type(str(file_path))
+    mime_type = guess_mime_type(file_name)
     
     # Encrypt content if needed
     content_to_write = self.encrypt_content(content)
     
     # Write the file (only once)
-    with open(file_path, "wb") as f:
-      f.write(content_to_write)
+    self._write_bytes(file_path, content_to_write)
     
     # Create relative path for return
-    rel_path = file_path.relative_to(self.base_path).as_posix()
+    rel_path = self._get_rel_path(file_path)
     
     node = FileNode(
-      name=file_path.name,
+      name=file_name,
       path=rel_path,
       size=size,
       mime_type=mime_type,
@@ -138,36 +356,28 @@ class LocalFilesStore(FilesStore):
     Returns:
         FileNode: The written file node.
     """
-    source_path = Path(file_path)
-    if not source_path.exists():
+    # Get file stats from source, also checking it exists
+    try:
+      stat = os.stat(file_path)
+    except FileNotFoundError:
       raise FileNotFoundError(f"Source file {file_path} does not exist")
     
-    # Create the target directory
     target_dir = self._get_full_path(folder)
-    target_dir.mkdir(parents=True, exist_ok=True)
     
     # Create the full file path
-    destination_path = target_dir / source_path.name
+    file_name = os.path.basename(file_path)
+    destination_path = os.path.join(target_dir, file_name)
     
-    # Get file stats from source
-    stat = source_path.stat()
-    mime_type, _ = mimetypes.guess_type(str(source_path))
+    mime_type = guess_mime_type(file_name)
     
-    # Copy the file
-    if self.fernet:
-      with open(source_path, "rb") as f:
-        content = f.read()
-      encrypted_content = self.encrypt_content(content)
-      with open(destination_path, "wb") as f:
-        f.write(encrypted_content)
-    else:
-      shutil.copy2(source_path, destination_path)
+    # Copy the file in the target directory, which is created if needed
+    self._in_dir(target_dir, self._copy_local_file, file_path, destination_path)
     
     # Create relative path for return
-    rel_path = destination_path.relative_to(self.base_path).as_posix()
+    rel_path = self._get_rel_path(destination_path)
     
     node = FileNode(
-      name=destination_path.name,
+      name=file_name,
       path=rel_path,
       size=stat.st_size,
       mime_type=mime_type,
@@ -179,6 +389,22 @@ class LocalFilesStore(FilesStore):
     
     return node
   
+  def _copy_local_file(self, file_path: str, destination_path: str):
+    """Copy a local file into the store, encrypting it if enabled.
+
+    Args:
+        file_path (str): The path to the local file.
+        destination_path (str): The path to the file in the store.
+    """
+    if self.is_encrypted:
+      with open(file_path, "rb", buffering=0) as f:
+        content = f.read()
+      encrypted_content = self.encrypt_content(content)
+      self._write_bytes(destination_path, encrypted_content)
+    else:
+      shutil.copy2(file_path, destination_path)
+      self._sync_file(destination_path)
+  
   async def get_file(self, file_path: str) -> Tuple[Any, Any]:
     """Extract file content and mimetype from local storage
 
@@ -190,18 +416,45 @@ class LocalFilesStore(FilesStore):
     """
     full_path = self._get_full_path(file_path)
     
-    if not full_path.exists() or not full_path.is_file():
+    # Read file content, opening it is enough to check it is an existing file
+    try:
+      with open(full_path, "rb", buffering=0) as f:
+        content = f.read()
+    except (FileNotFoundError, IsADirectoryError):
       raise FileNotFoundError(f"File {file_path} does not exist")
-    
-    # Read file content
-    with open(full_path, "rb") as f:
-      content = self.decrypt_content(f.read())
+    content = self.decrypt_content(content)
     
     # Get mimetype
-    mime_type, _ = mimetypes.guess_type(str(full_path))
+    mime_type = guess_mime_type(os.path.basename(full_path))
     
     return content, mime_type
   
+  async def iter_file(self, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Iterate over the file content in chunks, e.g. to stream it in a response.
+    Unencrypted files are read chunk by chunk, so that they are never fully loaded in memory.
+
+    Args:
+        file_path (str): Path of the file
+        chunk_size (int, optional): The maximum size of each chunk. Defaults to 1 MB.
+
+    Yields:
+        bytes: The next chunk of the (decrypted) file content.
+    """
+    if self.is_encrypted:
+      # Encrypted content can only be decrypted as a whole
+      async for chunk in super().iter_file(file_path, chunk_size):
+        yield chunk
+      return
+    
+    full_path = self._get_full_path(file_path)
+    
+    if not os.path.isfile(full_path):
+      raise FileNotFoundError(f"File {file_path} does not exist")
+    
+    with open(full_path, "rb") as f:
+      while chunk := f.read(chunk_size):
+        yield chunk
+  
   async def list_files(self, folder: str, recursive: bool = False) -> List[FileNode]:
     """List the files in the specified folder.
 
@@ -214,40 +467,56 @@ class LocalFilesStore(FilesStore):
     """
     target_dir = self._get_full_path(folder)
     
-    if not target_dir.exists():
+    if not os.path.exists(target_dir):
       return []
     
-    if not target_dir.is_dir():
+    if not os.path.isdir(target_dir):
       raise ValueError(f"Path {folder} is not a directory")
     
+    return self._list_dir(target_dir, recursive)
+  
+  def _list_dir(self, dir_path: str, recursive: bool) -> List[FileNode]:
+    """List the file nodes of a directory, with a single directory scan.
+
+    Args:
+        dir_path (str): The full path to the directory.
+        recursive (bool): Whether to list files recursively.
+    
+    Returns:
+        List[FileNode]: The list of file nodes in the directory.
+    """
     file_nodes = []
     
-    for item in target_dir.iterdir():
-      if item.suffix == self.meta_extension:
-        continue  # Skip metadata files
-      
-      rel_path = item.relative_to(self.base_path).as_posix()
+    with os.scandir(dir_path) as scan:
+      entries = list(scan)
+    # Index the directory names, to know which files have metadata without probing them
+    names = {entry.name for entry in entries}
+    
+    for entry in entries:
+      if entry.name.endswith(self.meta_extension) or self._tmp_meta_pattern.search(entry.name):
+        continue  # Skip metadata files, and metadata files being written
       
       # List meta files only as part of the associated file
-      if item.is_file():
+      if entry.is_file():
         # Read associated file node
         try:
-          node = self._read_file_node(item)
+          if entry.name + self.meta_extension in names:
+            node = self._read_file_node(entry.path)
+          else:
+            node = self._stat_file_node(entry.path, entry.stat())
           if node:
             file_nodes.append(node)
         except Exception as e:
-          logging.warning(f"Could not read metadata for {item}: {e}")
-      elif item.is_dir():
+          logging.warning(f"Could not read metadata for {entry.path}: {e}")
+      elif entry.is_dir():
         folder_node = FileNode(
-          name=item.name,
-          path=rel_path,
+          name=entry.name,
+          path=self._get_rel_path(entry.path),
           is_file=False
         )
         if recursive:
           # Recursively list files in subdirectory
-          subfolder = rel_path
-          sub_files = await self.list_files(subfolder, recursive=True)
-          folder_node.children = sub_files
+          folder_node.children = self._list_dir(entry.path, recursive=True)
         file_nodes.append(folder_node)
     
     return file_nodes
@@ -263,7 +532,7 @@ class LocalFilesStore(FilesStore):
     """
     try:
       full_path = self._get_full_path(path)
-      return full_path.exists()
+      return os.path.exists(full_path)
     except (ValueError, Exception) as e:
       logging.error(f"Error checking path existence for {path}: {e}")
       return False
@@ -282,19 +551,18 @@ class LocalFilesStore(FilesStore):
       source = self._get_full_path(source_path)
       destination = self._get_full_path(destination_path)
       
-      if not source.exists():
+      if not os.path.exists(source):
         raise FileNotFoundError(f"Source file {source_path} does not exist")
       
-      # Create parent directory if it doesn't exist
-      destination.parent.mkdir(parents=True, exist_ok=True)
-      
-      shutil.copy2(source, destination)
+      # Copy content only, in kernel space when supported (sendfile, copy_file_range...),
+      # creating the parent directory if it doesn't exist
+      self._in_dir(os.path.dirname(destination), shutil.copyfile, source, destination)
       
       # Read metadata from source and write to destination
       try:
         node = self._read_file_node(source)
         # Create new node for destination
-        node.name = destination.name
+        node.name = os.path.basename(destination)
         node.path = destination_path
         self._dump_file_node(node, destination)
       except Exception as e:
@@ -319,19 +587,27 @@ class LocalFilesStore(FilesStore):
       source = self._get_full_path(source_path)
       destination = self._get_full_path(destination_path)
       
-      if not source.exists():
+      if not os.path.exists(source):
         raise FileNotFoundError(f"Source file {source_path} does not exist")
       
-      # Create parent directory if it doesn't exist
-      destination.parent.mkdir(parents=True, exist_ok=True)
-      
-      shutil.move(source, destination)
+      try:
+        # Rename in place, which is a metadata-only operation on the same filesystem,
+        # creating the parent directory if it doesn't exist
+        self._in_dir(os.path.dirname(destination), os.replace, source, destination)
+      except OSError as e:
+        if e.errno != errno.EXDEV:
+          raise
+        # Cross-device move: fall back to copy and delete
+        shutil.move(source, destination)
+      if os.path.isdir(destination):
+        self._forget_file_nodes(source)
+        self._forget_dirs(source)
       
       # Move metadata from source to destination
       try:
         node = self._read_file_node(source)
         # Update path in node
-        node.name = destination.name
+        node.name = os.path.basename(destination)
         node.path = destination_path
         self._dump_file_node(node, destination)
         # Remove old metadata file
@@ -356,23 +632,27 @@ class LocalFilesStore(FilesStore):
     try:
       full_path = self._get_full_path(file_path)
       
-      if not full_path.exists():
+      if not os.path.exists(full_path):
         return False
       
-      if full_path.is_file():
-        full_path.unlink()
+      if os.path.isfile(full_path):
+        os.unlink(full_path)
         self._delete_file_node(full_path)
-      elif full_path.is_dir():
+      elif os.path.isdir(full_path):
         shutil.rmtree(full_path)
+        self._forget_file_nodes(full_path)
+        self._forget_dirs(full_path)
       
-      if full_path.parent.exists():
+      parent_path = os.path.dirname(full_path)
+      if os.path.exists(parent_path):
         # Clean parent folder if it is empty
-        is_empty = not any(full_path.parent.iterdir())
+        is_empty = not os.listdir(parent_path)
         if is_empty:
           try:
-            full_path.parent.rmdir()
+            os.rmdir(parent_path)
+            self._forget_dirs(parent_path)
           except OSError:
-            logging.error(f"Could not remove directory: {full_path.parent}")
+            logging.error(f"Could not remove directory: {parent_path}")
       
       return True
     except Exception as e:
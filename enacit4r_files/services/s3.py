@@ -1,20 +1,33 @@
-from typing import List, Tuple, Any
+from typing import List, Optional, Tuple, Any, Union
+from contextlib import AsyncExitStack, asynccontextmanager
 from aiobotocore.session import get_session
 from botocore.config import Config
+from cryptography.fernet import Fernet
 from io import BytesIO
 from fastapi.datastructures import UploadFile
 from starlette.datastructures import Headers
 from PIL import Image
-from ..utils.files import FileNodeBuilder, image_mimetypes
+from ..utils.files import FileNodeBuilder, image_mimetypes, guess_mime_type
 from ..models.files import FileRef, FileNode
 from .files import FilesStore
+import asyncio
+import json
 import logging
 import os
 import urllib.parse
-import mimetypes
-import tempfile
+import time
+from collections import OrderedDict
 from pathlib import Path
 
+# maximum number of concurrent S3 requests when reading the nodes of a listing
+LIST_MAX_CONCURRENCY = 32
+# first characters of the keys delimiting the shards of a parallel listing, in S3 (code point) order
+LIST_SHARD_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+# user metadata entry holding the file node fields of an object
+FILE_NODE_METADATA = "file-node"
+# file node fields that are derived from the object key and headers
+FILE_NODE_KEY_FIELDS = {"name", "path", "mime_type", "children"}
+
 class S3Error(Exception):
     """Exception raised when managing S3 files."""
     pass
@@ -41,6 +54,34 @@ class S3Service(object):
         self.path_prefix = path_prefix if path_prefix.endswith("/") else f"{path_prefix}/"
         self.bucket = bucket
         self.with_checksums = with_checksums
+        self._session = None
+        self._shared_client = None
+        self._client_stack = None
+
+    async def open(self):
+        """Open a S3 client that is shared by all the requests, until the service is closed.
+        Otherwise each request creates its own client and connections.
+        """
+        if self._client_stack is None:
+            stack = AsyncExitStack()
+            self._shared_client = await stack.enter_async_context(self._create_client())
+            self._client_stack = stack
+
+    async def close(self):
+        """Close the shared S3 client, if any.
+        """
+        if self._client_stack is not None:
+            stack = self._client_stack
+            self._client_stack = None
+            self._shared_client = None
+            await stack.aclose()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
     def to_s3_path(self, file_path: str) -> str:
         """Ensure that file path starts with path prefix.
@@ -78,7 +119,7 @@ class S3Service(object):
         key = self.to_s3_key(file_path)
 
         # check if file_path exists
-        async with self._create_client() as client:
+        async with self._client() as client:
             try:
                 response = await client.head_object(
                     Bucket=self.bucket, Key=key)
@@ -88,6 +129,27 @@ class S3Service(object):
                 return False
         return False
 
+    async def head_file(self, file_path: str) -> Any:
+        """Get the headers and user metadata of a file in S3 storage, without its content
+
+        Args:
+            file_path (str): Path of the file in S3
+
+        Returns:
+            Any: The head_object response, False if the file does not exist
+        """
+        key = self.to_s3_key(file_path)
+
+        async with self._client() as client:
+            try:
+                response = await client.head_object(
+                    Bucket=self.bucket, Key=key)
+                if response["ResponseMetadata"]["HTTPStatusCode"] == 200:
+                    return response
+            except Exception as e:
+                return False
+        return False
+
     async def list_files(self, folder_path: str) -> List[str]:
         """List files in a folder in S3 storage
 
@@ -101,7 +163,7 @@ class S3Service(object):
 
         keys = []
         # list files in folder_path
-        async with self._create_client() as client:
+        async with self._client() as client:
             paginator = client.get_paginator('list_objects_v2')
             async for page in paginator.paginate(Bucket=self.bucket, Prefix=key):
                 if 'Contents' in page:
@@ -109,6 +171,54 @@ class S3Service(object):
                         keys.append(obj['Key'])
         return keys
 
+    async def list_files_parallel(self, folder_path: str, num_shards: int = 16) -> List[str]:
+        """List files in a folder in S3 storage, with concurrent listings of key ranges.
+        The ranges are delimited by the first character of the keys in the folder, so this is
+        worth it for large folders only.
+
+        Args:
+            folder_path (str): Path of the folder in S3
+            num_shards (int, optional): The number of concurrent listings. Defaults to 16.
+
+        Returns:
+            List[str]: An array of S3 file keys, in the same order as list_files.
+        """
+        key = self.to_s3_key(folder_path)
+        base = key if key.endswith("/") else f"{key}/"
+        num_shards = max(1, min(num_shards, len(LIST_SHARD_CHARACTERS)))
+        step = len(LIST_SHARD_CHARACTERS) / num_shards
+        # each shard lists the keys after its lower bound, up to and including its upper bound
+        bounds = [None] + [f"{base}{LIST_SHARD_CHARACTERS[int(i * step)]}" for i in range(1, num_shards)] + [None]
+
+        async with self._client() as client:
+            shards = await asyncio.gather(
+                *(self._list_shard(client, key, bounds[i], bounds[i + 1]) for i in range(num_shards)))
+        return [shard_key for shard in shards for shard_key in shard]
+
+    async def _list_shard(self, client, prefix: str, start_after: str, stop_at: str) -> List[str]:
+        """List the keys of a range, see list_files_parallel.
+
+        Args:
+            client (Any): The S3 client.
+            prefix (str): The prefix of the keys.
+            start_after (str): The key after which the range starts, None from the first key.
+            stop_at (str): The last key of the range, None up to the last key.
+
+        Returns:
+            List[str]: The keys in the range.
+        """
+        keys = []
+        list_kwargs = {'Bucket': self.bucket, 'Prefix': prefix}
+        if start_after is not None:
+            list_kwargs['StartAfter'] = start_after
+        paginator = client.get_paginator('list_objects_v2')
+        async for page in paginator.paginate(**list_kwargs):
+            for obj in page.get('Contents', []):
+                if stop_at is not None and obj['Key'] > stop_at:
+                    return keys
+                keys.append(obj['Key'])
+        return keys
+
     async def get_file(self, file_path: str) -> Tuple[Any, Any]:
         """Extract file content and mimetype from S3 storage
 
@@ -121,7 +231,7 @@ class S3Service(object):
         key = self.to_s3_key(file_path)
 
         # get file from file path
-        async with self._create_client() as client:
+        async with self._client() as client:
             try:
                 response = await client.get_object(
                     Bucket=self.bucket, Key=key)
@@ -133,7 +243,7 @@ class S3Service(object):
                 return False, False
         return False, False
 
-    async def upload_local_file(self, parent_path, file_path: str, s3_folder: str = "", mime_type: str = None) -> FileRef:
+    async def upload_local_file(self, parent_path, file_path: str, s3_folder: str = "", mime_type: str = None, metadata: dict = None) -> FileRef:
         """Upload local file to S3 storage
 
         Args:
@@ -141,6 +251,7 @@ class S3Service(object):
             file_path (str): Path to local file relative to parent path
             s3_folder (str, optional): Relative parent folder in S3. Defaults to "".
             mime_type (str, optional): MIME type of the file. Defaults to None.
+            metadata (dict, optional): User metadata to attach to the uploaded objects. Defaults to None.
 
         Returns:
             FileRef: S3 upload reference
@@ -148,30 +259,33 @@ class S3Service(object):
 
         content_type =  mime_type if mime_type is not None else self._get_mime_type(file_path)
         if content_type in image_mimetypes:
-            return await self._upload_local_image(parent_path, file_path, s3_folder)
-        return await self._upload_local_file(parent_path, file_path, s3_folder, mime_type=content_type)
+            return await self._upload_local_image(parent_path, file_path, s3_folder, metadata=metadata)
+        return await self._upload_local_file(parent_path, file_path, s3_folder, mime_type=content_type, metadata=metadata)
 
-    async def upload_file(self, upload_file: UploadFile, s3_folder: str = "") -> FileRef:
+    async def upload_file(self, upload_file: UploadFile, s3_folder: str = "", metadata: dict = None) -> FileRef:
         """Upload file to S3 storage
 
         Args:
             upload_file (UploadFile): UploadFile object
             s3_folder (str, optional): Relative parent folder in S3. Defaults to "".
+            metadata (dict, optional): User metadata to attach to the uploaded objects. Defaults to None.
 
         Returns:
             FileRef: S3 upload reference
         """
         # if mimetype is image upload image
         if upload_file.content_type in image_mimetypes:
-            return await self._upload_image(upload_file, s3_folder)
-        return await self._upload_file(upload_file, s3_folder)
+            return await self._upload_image(upload_file, s3_folder, metadata=metadata)
+        return await self._upload_file(upload_file, s3_folder, metadata=metadata)
 
-    async def move_file(self, file_path: str, destination_path: str) -> Any:
+    async def move_file(self, file_path: str, destination_path: str, metadata: dict = None, mime_type: str = None) -> Any:
         """Move a file from one location to another in the same S3 storage
 
         Args:
             file_path (str): Path of the file in S3
             destination_path (str): Destination path in S3
+            metadata (dict, optional): User metadata replacing the source one. Defaults to None, to keep it.
+            mime_type (str, optional): MIME type of the file when its metadata is replaced. Defaults to None.
 
         Returns:
             Any: File S3 key if deleted, False otherwise
@@ -181,17 +295,19 @@ class S3Service(object):
         destination_key = self.to_s3_key(destination_path)
 
         # copy to new location and delete source
-        res = await self.copy_file(source_key, destination_key)
+        res = await self.copy_file(source_key, destination_key, metadata=metadata, mime_type=mime_type)
         if res is not False:
             await self.delete_file(source_key)
         return res
 
-    async def copy_file(self, file_path: str, destination_path: str) -> Any:
+    async def copy_file(self, file_path: str, destination_path: str, metadata: dict = None, mime_type: str = None) -> Any:
         """Copy a file from one location to another in the same S3 storage
 
         Args:
             file_path (str): Path of the file in S3
             destination_path (str): Destination path in S3
+            metadata (dict, optional): User metadata replacing the source one. Defaults to None, to keep it.
+            mime_type (str, optional): MIME type of the file when its metadata is replaced. Defaults to None.
 
         Returns:
             Any: File S3 key if deleted, False otherwise
@@ -201,12 +317,19 @@ class S3Service(object):
         destination_key = self.to_s3_key(destination_path)
 
         # copy file_path to new location
-        async with self._create_client() as client:
-            response = await client.copy_object(
-                Bucket=self.bucket,
-                CopySource={'Bucket': self.bucket, 'Key': source_key},
-                ACL="public-read",
-                Key=destination_key)
+        copy_kwargs = {
+            'Bucket': self.bucket,
+            'CopySource': {'Bucket': self.bucket, 'Key': source_key},
+            'ACL': "public-read",
+            'Key': destination_key
+        }
+        if metadata is not None:
+            copy_kwargs['MetadataDirective'] = "REPLACE"
+            copy_kwargs['Metadata'] = metadata
+            if mime_type is not None:
+                copy_kwargs['ContentType'] = mime_type
+        async with self._client() as client:
+            response = await client.copy_object(**copy_kwargs)
             if response["ResponseMetadata"]["HTTPStatusCode"] == 200:
                 logging.info(
                     f"File copied path : {self.s3_endpoint_url}/{self.bucket}/{destination_key}")
@@ -225,7 +348,7 @@ class S3Service(object):
         key = self.to_s3_key(file_path)
 
         # delete file_path
-        async with self._create_client() as client:
+        async with self._client() as client:
             response = await client.delete_object(
                 Bucket=self.bucket, Key=key)
             if response["ResponseMetadata"]["HTTPStatusCode"] == 204:
@@ -246,7 +369,7 @@ class S3Service(object):
         folder_key = self.to_s3_key(file_path)
 
         # delete file_path
-        async with self._create_client() as client:
+        async with self._client() as client:
             # delete content, if any
             paginator = client.get_paginator('list_objects_v2')
             async for result in paginator.paginate(Bucket=self.bucket, Prefix=folder_key):
@@ -269,6 +392,19 @@ class S3Service(object):
     # Private methods
     #
     
+    @asynccontextmanager
+    async def _client(self):
+        """Get the shared S3 client if the service is open, or a client for a single request.
+
+        Yields:
+            Any: The S3 client.
+        """
+        if self._shared_client is not None:
+            yield self._shared_client
+        else:
+            async with self._create_client() as client:
+                yield client
+
     def _create_client(self):
         """Create an S3 client using the provided credentials and endpoint URL.
 
@@ -288,11 +424,13 @@ class S3Service(object):
         config = Config(
             s3=settings,
             signature_version='s3v4',
-            disable_request_compression=True
+            disable_request_compression=True,
+            max_pool_connections=LIST_MAX_CONCURRENCY
         )
             
-        session = get_session()
-        return session.create_client(
+        if self._session is None:
+            self._session = get_session()
+        return self._session.create_client(
             's3',
             region_name=self.region,
             endpoint_url=self.s3_endpoint_url,
@@ -335,12 +473,13 @@ class S3Service(object):
         name = split_file_name[0]
         return (f"{s3_folder}/{name}{ext}", f"{name}{ext}")
 
-    async def _upload_image(self, upload_file: UploadFile, s3_folder: str = "") -> FileRef:
+    async def _upload_image(self, upload_file: UploadFile, s3_folder: str = "", metadata: dict = None) -> FileRef:
         """Upload image to S3, convert to webp if necessary
 
         Args:
             upload_file (UploadFile): UploadFile object
             s3_folder (str, optional): Relative parent folder in S3. Defaults to "".
+            metadata (dict, optional): User metadata to attach to the uploaded objects. Defaults to None.
 
         Raises:
             S3Error: When S3 upload fails
@@ -350,7 +489,7 @@ class S3Service(object):
         """
         if upload_file.content_type == "image/webp":
             # no need to convert to webp
-            return await self._upload_file(upload_file, s3_folder)
+            return await self._upload_file(upload_file, s3_folder, metadata=metadata)
         else:
             # convert to bytes
             (data, origin_data) = await self._convert_image(upload_file)
@@ -363,7 +502,8 @@ class S3Service(object):
             uploads3 = await self._upload_fileobj(bucket=self.bucket,
                                                   key=key,
                                                   data=data.getvalue(),
-                                                  mimetype=mimetype)
+                                                  mimetype=mimetype,
+                                                  metadata=metadata)
 
             if not uploads3:
                 raise S3Error("Failed to upload image to S3")
@@ -375,7 +515,8 @@ class S3Service(object):
                 bucket=self.bucket,
                 key=alt_key,
                 data=origin_data.getvalue(),
-                mimetype=upload_file.content_type)
+                mimetype=upload_file.content_type,
+                metadata=metadata)
 
             if not alt_uploads3:
                 raise S3Error("Failed to upload image to S3")
@@ -392,12 +533,13 @@ class S3Service(object):
                     alt_mime_type=upload_file.content_type
                 )
 
-    async def _upload_file(self, upload_file: UploadFile, s3_folder: str = "") -> FileRef:
+    async def _upload_file(self, upload_file: UploadFile, s3_folder: str = "", metadata: dict = None) -> FileRef:
         """Upload file to S3, as is
 
         Args:
             upload_file (UploadFile): UploadFile object
             s3_folder (str, optional): Relative parent folder in S3. Defaults to "".
+            metadata (dict, optional): User metadata to attach to the object. Defaults to None.
 
         Raises:
             S3Error: When S3 upload fails
@@ -409,8 +551,9 @@ class S3Service(object):
         key = f"{self.path_prefix}{filename}"
         uploads3 = await self._upload_fileobj(bucket=self.bucket,
                                               key=key,
-                                              data=getattr(upload_file.file, '_file', upload_file.file),
-                                              mimetype=upload_file.content_type)
+                                              data=upload_file.file,
+                                              mimetype=upload_file.content_type,
+                                              metadata=metadata)
         if uploads3:
             # response http to be used by the frontend
             return FileRef(
@@ -422,13 +565,14 @@ class S3Service(object):
         else:
             raise S3Error("Failed to upload file to S3")
 
-    async def _upload_local_image(self, parent_path, file_path: str, s3_folder: str = "") -> FileRef:
+    async def _upload_local_image(self, parent_path, file_path: str, s3_folder: str = "", metadata: dict = None) -> FileRef:
         """Upload local image to S3, convert to webp if necessary
 
         Args:
             parent_path (str): Parent path of the file
             file_path (str): Path to local file relative to parent path
             s3_folder (str, optional): Relative parent folder in S3. Defaults to "".
+            metadata (dict, optional): User metadata to attach to the uploaded objects. Defaults to None.
 
         Raises:
             S3Error: When S3 upload fails
@@ -438,7 +582,7 @@ class S3Service(object):
         """
         if file_path.endswith(".webp"):
             # no need to convert to webp
-            return await self._upload_local_file(parent_path, file_path, s3_folder)
+            return await self._upload_local_file(parent_path, file_path, s3_folder, metadata=metadata)
         else:
             alt_info = None
             try:
@@ -448,13 +592,13 @@ class S3Service(object):
 
                 # upload converted file
                 alt_info = await self._upload_local_file(
-                    parent_path, file_path_alt, s3_folder)
+                    parent_path, file_path_alt, s3_folder, metadata=metadata)
             except Exception as e:
                 logging.error(e)
 
             # Original file
             orig_info = await self._upload_local_file(
-                parent_path, file_path, s3_folder)
+                parent_path, file_path, s3_folder, metadata=metadata)
 
             # response http to be used by the frontend
             return FileRef(
@@ -478,7 +622,7 @@ class S3Service(object):
 
         return file_path_webp
 
-    async def _upload_local_file(self, parent_path, file_path: str, s3_folder: str = "", mime_type: str = None) -> FileRef:
+    async def _upload_local_file(self, parent_path, file_path: str, s3_folder: str = "", mime_type: str = None, metadata: dict = None) -> FileRef:
         """Upload file to S3, as is
 
         Args:
@@ -486,6 +630,7 @@ class S3Service(object):
             file_path (str): Path to local file relative to parent path
             s3_folder (str, optional): Relative parent folder in S3. Defaults to "".
             mime_type (str, optional): MIME type of the file. Defaults to None.
+            metadata (dict, optional): User metadata to attach to the object. Defaults to None.
 
         Raises:
             S3Error: When S3 upload fails
@@ -502,7 +647,8 @@ class S3Service(object):
             uploads3 = await self._upload_fileobj(bucket=self.bucket,
                                                   key=key,
                                                   data=file,
-                                                  mimetype=mime_type)
+                                                  mimetype=mime_type,
+                                                  metadata=metadata)
         if uploads3:
             # response http to be used by the frontend
             return FileRef(
@@ -514,7 +660,7 @@ class S3Service(object):
         else:
             raise S3Error("Failed to upload file to S3")
 
-    async def _upload_fileobj(self, data: BytesIO, bucket: str, key: str, mimetype: str) -> bool:
+    async def _upload_fileobj(self, data: BytesIO, bucket: str, key: str, mimetype: str, metadata: dict = None) -> bool:
         """Perform the data upload to S3
 
         Args:
@@ -522,11 +668,12 @@ class S3Service(object):
             bucket (str): Destination bucket
             key (str): Path of the obejct in the bucket
             mimetype (str): Object mimetype
+            metadata (dict, optional): User metadata (x-amz-meta-*) of the object. Defaults to None.
 
         Returns:
             bool: True if upload was successful, the object size in bytes otherwise
         """
-        async with self._create_client() as client:
+        async with self._client() as client:
             # Disable checksums for S3-compatible services that don't support them
             put_kwargs = {
                 'Bucket': bucket,
@@ -535,6 +682,8 @@ class S3Service(object):
                 'ACL': 'public-read',
                 'ContentType': mimetype
             }
+            if metadata:
+                put_kwargs['Metadata'] = metadata
 
             resp = await client.put_object(**put_kwargs)
 
@@ -556,7 +705,7 @@ class S3Service(object):
         Returns:
             str: A standard mime type string.
         """
-        mime_type, encoding = mimetypes.guess_type(file_name)
+        mime_type = guess_mime_type(file_name)
         if mime_type is None:
             if file_name.endswith('.webp'):
                 mime_type = 'image/webp'
@@ -570,11 +719,69 @@ class S3FilesStore(FilesStore):
   This service provides file-related operations on a S3 storage backend.
   """
   
-  def __init__(self, s3_service: S3Service, key: bytes = None):
-    """Initialize the files service."""
-    super().__init__(key=key)
+  def __init__(self, s3_service: S3Service, key: Union[bytes, Fernet] = None, use_aesgcm: bool = False,
+               metadata_cache_enabled: bool = False, metadata_cache_ttl_s: int = 300, metadata_cache_max_items: int = 1024,
+               mount_path: str = None):
+    """Initialize the files service.
+
+    Args:
+        s3_service (S3Service): The S3 service.
+        key (bytes or Fernet, optional): The encryption key, or a Fernet cipher. Defaults to None.
+        use_aesgcm (bool, optional): Whether to encrypt with AES-GCM instead of Fernet. Defaults to False.
+        metadata_cache_enabled (bool, optional): Whether to cache the file metadata read from S3, to spare
+            repeated requests. Changes made through other stores are only seen once the cached entry expires.
+            Defaults to False.
+        metadata_cache_ttl_s (int, optional): How long the cached file metadata is used, in seconds. Defaults to 300.
+        metadata_cache_max_items (int, optional): The maximum number of cached file metadata. Defaults to 1024.
+        mount_path (str, optional): The local directory where the S3 path prefix is mounted (e.g. with
+            Mountpoint for Amazon S3 or s3fs-fuse). Unencrypted local files from this directory are copied
+            server-side instead of being uploaded. Defaults to None.
+    """
+    super().__init__(key=key, use_aesgcm=use_aesgcm)
     self.s3_service = s3_service
+    self.metadata_cache_enabled = metadata_cache_enabled
+    self.metadata_cache_ttl_s = metadata_cache_ttl_s
+    self.metadata_cache_max_items = metadata_cache_max_items
+    self._node_cache: OrderedDict[str, Tuple[float, FileNode, bool]] = OrderedDict()
+    self.mount_path = Path(mount_path).resolve() if mount_path else None
   
+  def _file_node_metadata(self, file_node: FileNode) -> dict:
+    """Make the user metadata storing a FileNode along with its object.
+
+    Args:
+        file_node (FileNode): The file node to store.
+
+    Returns:
+        dict: The S3 user metadata.
+    """
+    return {FILE_NODE_METADATA: file_node.model_dump_json(exclude=FILE_NODE_KEY_FIELDS, exclude_none=True)}
+
+  def _is_converted_image(self, mime_type: str) -> bool:
+    """Check whether an upload is converted to a webp image, stored next to the original one.
+    Such image pairs are only known once uploaded, so their FileNode is dumped in a JSON sidecar.
+
+    Args:
+        mime_type (str): The mime type of the uploaded file.
+
+    Returns:
+        bool: True if the upload is converted, False otherwise.
+    """
+    return mime_type in image_mimetypes and mime_type != "image/webp"
+
+  def _migrate_file_node(self, file_node: FileNode) -> dict:
+    """Get the arguments of a server-side copy that moves a FileNode read from a JSON
+    file into the object metadata. Converted images keep their JSON file.
+
+    Args:
+        file_node (FileNode): The file node read from a JSON file, if any.
+
+    Returns:
+        dict: The copy arguments, empty if the file node cannot be migrated.
+    """
+    if file_node is None or file_node.alt_name is not None:
+      return {}
+    return {"metadata": self._file_node_metadata(file_node), "mime_type": file_node.mime_type}
+
   async def _dump_file_node(self, file_node: FileNode, folder: str):
     """Dump a FileNode to a JSON file in S3.
     Args:
@@ -582,17 +789,112 @@ class S3FilesStore(FilesStore):
         folder (str): The folder in S3 to dump the file node to.
     """
     json_name = f"{file_node.name}{self.meta_extension}"
-    # Make temp directory and dump json file
-    with tempfile.TemporaryDirectory() as temp_dir:
-      temp_path = Path(temp_dir) / json_name
-      with open(temp_path, "w") as f:
-        f.write(file_node.model_dump_json())
-      # Upload to S3
-      s3_folder = folder.rstrip("/") if folder else ""
-      with open(temp_path, "rb") as f:
-        await self.s3_service.upload_local_file(str(temp_path.parent), json_name, s3_folder)
+    # Upload the serialized json from memory
+    json_file = UploadFile(
+      filename=json_name,
+      file=BytesIO(file_node.model_dump_json().encode("utf-8")),
+      headers=Headers({'content-type': 'application/json'})
+    )
+    s3_folder = folder.rstrip("/") if folder else ""
+    await self.s3_service.upload_file(json_file, s3_folder)
   
-  async def _read_file_node(self, file_key: str) -> FileNode:
+  async def _read_file_node(self, file_key: str, json_file: bool = None) -> FileNode:
+    """Read a FileNode from the user metadata of an object in S3, or from its JSON file.
+    Args:
+        file_key (str): The S3 key of the reference file.
+        json_file (bool, optional): Whether the file is known to have a JSON file, e.g. from a listing.
+            Defaults to None (unknown).
+    Returns:
+        FileNode: The loaded file node if available, otherwise None.
+    """
+    file_node, _ = await self._head_file_node(file_key, json_file)
+    return file_node
+
+  async def _head_file_node(self, file_key: str, json_file: bool = None) -> Tuple[FileNode, bool]:
+    """Read a FileNode from the user metadata of an object in S3. Objects without such
+    metadata fall back to their JSON file, if any. Found file nodes are cached, if enabled.
+    Args:
+        file_key (str): The S3 key of the reference file.
+        json_file (bool, optional): Whether the file is known to have a JSON file, which is then read
+            without a HEAD request (True), or not to have one, which is then not requested (False).
+            Defaults to None (unknown).
+    Returns:
+        Tuple[FileNode, bool]: The loaded file node if available, otherwise None, and
+        whether it was read from a JSON file.
+    """
+    if not self.metadata_cache_enabled:
+      return await self._fetch_file_node(file_key, json_file)
+    cache_key = self.s3_service.to_s3_key(file_key)
+    cached = self._get_cached_file_node(cache_key)
+    if cached is not None:
+      return cached[1].model_copy(), cached[2]
+    file_node, from_json = await self._fetch_file_node(file_key, json_file)
+    if file_node is not None:
+      self._node_cache[cache_key] = (time.monotonic() + self.metadata_cache_ttl_s, file_node.model_copy(), from_json)
+      if len(self._node_cache) > self.metadata_cache_max_items:
+        self._node_cache.popitem(last=False)
+    return file_node, from_json
+
+  def _get_cached_file_node(self, cache_key: str) -> Optional[Tuple[float, FileNode, bool]]:
+    """Get the cache entry of a FileNode, if any and not expired.
+    Args:
+        cache_key (str): The S3 key of the file.
+    Returns:
+        Tuple[float, FileNode, bool]: The expiry time, the cached file node and whether it was read
+        from a JSON file, or None if not cached.
+    """
+    cached = self._node_cache.get(cache_key)
+    if cached is None:
+      return None
+    if time.monotonic() >= cached[0]:
+      del self._node_cache[cache_key]
+      return None
+    self._node_cache.move_to_end(cache_key)
+    return cached
+
+  def _forget_file_nodes(self, file_path: str):
+    """Remove the cached FileNode of a file, or of all the files of a folder.
+    Args:
+        file_path (str): The path of the file or folder.
+    """
+    if not self._node_cache:
+      return
+    cache_key = self.s3_service.to_s3_key(file_path)
+    prefix = f"{cache_key}/"
+    for cached_key in [k for k in self._node_cache if k == cache_key or k.startswith(prefix)]:
+      del self._node_cache[cached_key]
+
+  async def _fetch_file_node(self, file_key: str, json_file: bool = None) -> Tuple[FileNode, bool]:
+    """Read a FileNode from S3, see :meth:`_head_file_node`.
+    Args:
+        file_key (str): The S3 key of the reference file.
+        json_file (bool, optional): Whether the file is known to have a JSON file. Defaults to None (unknown).
+    Returns:
+        Tuple[FileNode, bool]: The loaded file node if available, otherwise None, and
+        whether it was read from a JSON file.
+    """
+    if json_file or file_key.endswith(self.meta_extension):
+      return await self._read_json_file_node(file_key), True
+    response = await self.s3_service.head_file(file_key)
+    if response is False:
+      return None, False
+    node_json = response.get("Metadata", {}).get(FILE_NODE_METADATA)
+    if node_json is None:
+      if json_file is False:
+        return None, False
+      return await self._read_json_file_node(file_key), True
+    key = self.s3_service.to_s3_key(file_key)
+    prefix = self.s3_service.path_prefix
+    if key.startswith(prefix):
+      key = key[len(prefix):]
+    file_node = FileNode(
+      name=os.path.basename(key),
+      path=urllib.parse.quote(key),
+      mime_type=response.get("ContentType"),
+      **json.loads(node_json))
+    return file_node, False
+
+  async def _read_json_file_node(self, file_key: str) -> FileNode:
     """Read a FileNode from a JSON file in S3.
     Args:
         file_key (str): The S3 key of the reference file.
@@ -602,7 +904,7 @@ class S3FilesStore(FilesStore):
     json_key = f"{file_key}{self.meta_extension}" if not file_key.endswith(self.meta_extension) else file_key
     json_content, _ = await self.s3_service.get_file(json_key)
     if json_content is not False:
-      file_node = FileNode.model_validate_json(json_content.decode("utf-8"))
+      file_node = FileNode.model_validate_json(json_content)
       return file_node
     return None
   
@@ -625,28 +927,42 @@ class S3FilesStore(FilesStore):
         FileNode: The uploaded file node.
     """
     folder = self.sanitize_path(folder)
-    # Read and optionally encrypt the content
-    content = await upload_file.read()
-    size = len(content)
-    encrypted_content = self.encrypt_content(content)
+    file = upload_file.file
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    if self.is_encrypted:
+      # Encrypt the content, in chunks with AES-GCM, off the event loop
+      file = await asyncio.to_thread(self.encrypt_file, file)
+    # Otherwise stream the uploaded content as is
     
-    # Create a new UploadFile with encrypted content, preserving content type via headers
-    headers = Headers({'content-type': upload_file.content_type or 'application/octet-stream'})
-    encrypted_file = UploadFile(
-      filename=self.sanitize_file_name(upload_file.filename),
-      file=BytesIO(encrypted_content),
+    # Create a new UploadFile with the content to store, preserving content type via headers
+    content_type = upload_file.content_type or 'application/octet-stream'
+    headers = Headers({'content-type': content_type})
+    file_name = self.sanitize_file_name(upload_file.filename)
+    s3_file = UploadFile(
+      filename=file_name,
+      file=file,
       headers=headers
     )
     
-    # Upload to S3
-    file_ref = await self.s3_service.upload_file(encrypted_file, folder)
+    # Upload to S3, along with the file metadata
+    metadata = None
+    if not self._is_converted_image(content_type):
+      metadata = self._file_node_metadata(FileNode(name=file_name, size=size, is_file=True))
+    file_ref = await self.s3_service.upload_file(s3_file, folder, metadata=metadata)
     
     # Convert FileRef to FileNode
     node = FileNodeBuilder.from_ref(file_ref, self.s3_service.path_prefix).build()
     node.size = size  # Use original size before encryption
     
-    # Dump file metadata in S3
-    await self._dump_file_node(node, folder)
+    if metadata is None:
+      # Dump file metadata in S3
+      await self._dump_file_node(node, folder)
+    else:
+      # Drop the JSON file of a previous version, which would shadow the object metadata
+      await self._delete_file_node(f"{folder}/{file_name}" if folder else file_name)
+    self._forget_file_nodes(node.path)
     
     return node
 
@@ -671,37 +987,85 @@ class S3FilesStore(FilesStore):
     # Get original file size before encryption
     stat = source_path.stat()
     size = stat.st_size
+    metadata = None
+    if not self._is_converted_image(guess_mime_type(relative_path)):
+      metadata = self._file_node_metadata(FileNode(name=relative_path, size=size, is_file=True))
+    
+    source_key = self._get_mounted_key(source_path) if metadata is not None and not self.is_encrypted else None
+    if source_key is not None:
+      # The file is already in S3, copy it server-side
+      destination_path = f"{folder}/{relative_path}" if folder else relative_path
+      mime_type = guess_mime_type(relative_path) or 'application/octet-stream'
+      result = await self.s3_service.copy_file(source_key, destination_path, metadata=metadata, mime_type=mime_type)
+      if result is False:
+        raise S3Error("Failed to copy file in S3")
+      await self._delete_file_node(destination_path)
+      self._forget_file_nodes(destination_path)
+      return FileNode(
+        name=relative_path,
+        path=urllib.parse.quote(destination_path),
+        size=size,
+        mime_type=mime_type,
+        is_file=True)
     
     # If encryption is enabled, we need to encrypt the file first
-    if self.fernet:
-      with open(source_path, "rb") as f:
-        content = f.read()
-      encrypted_content = self.encrypt_content(content)
-      
-      # Write encrypted content to a temporary file
-      with tempfile.NamedTemporaryFile(delete=False, suffix=source_path.suffix) as temp_file:
-        temp_file.write(encrypted_content)
-        temp_path = temp_file.name
+    if self.is_encrypted:
+      encrypted_content = await asyncio.to_thread(self._encrypt_local_file, source_path)
       
-      try:
-        # Upload the temporary encrypted file
-        file_ref = await self.s3_service.upload_local_file(os.path.dirname(temp_path), os.path.basename(temp_path), folder)
-      finally:
-        # Clean up temporary file
-        os.unlink(temp_path)
+      # Upload the encrypted content from memory
+      headers = Headers({'content-type': guess_mime_type(relative_path) or 'application/octet-stream'})
+      encrypted_file = UploadFile(
+        filename=relative_path,
+        file=encrypted_content,
+        headers=headers
+      )
+      file_ref = await self.s3_service.upload_file(encrypted_file, folder, metadata=metadata)
     else:
       # Upload directly without encryption
-      file_ref = await self.s3_service.upload_local_file(parent_path, relative_path, folder)
+      file_ref = await self.s3_service.upload_local_file(parent_path, relative_path, folder, metadata=metadata)
     
     # Convert FileRef to FileNode
     node = FileNodeBuilder.from_ref(file_ref, self.s3_service.path_prefix).build()
     node.size = size  # Use original size before encryption
     
-    # Dump file metadata in S3
-    await self._dump_file_node(node, folder)
+    if metadata is None:
+      # Dump file metadata in S3
+      await self._dump_file_node(node, folder)
+    else:
+      # Drop the JSON file of a previous version, which would shadow the object metadata
+      await self._delete_file_node(f"{folder}/{relative_path}" if folder else relative_path)
+    self._forget_file_nodes(node.path)
     
     return node
 
+  def _get_mounted_key(self, file_path: Path) -> str:
+    """Get the path in S3 of a local file located in the mounted S3 path prefix.
+
+    Args:
+        file_path (Path): The path to the local file.
+
+    Returns:
+        str: The path of the file in S3, or None if the file is not in the mount path.
+    """
+    if self.mount_path is None:
+      return None
+    try:
+      return file_path.resolve().relative_to(self.mount_path).as_posix()
+    except ValueError:
+      return None
+
+  def _encrypt_local_file(self, file_path: Path) -> BytesIO:
+    """Read and encrypt a local file.
+
+    Args:
+        file_path (Path): The path to the local file.
+
+    Returns:
+        BytesIO: The encrypted content.
+    """
+    with open(file_path, "rb") as f:
+      return self.encrypt_file(f)
+
   async def get_file(self, file_path: str) -> Tuple[Any, Any]:
     """Extract file content and mimetype from storage.
 
@@ -716,120 +1080,138 @@ class S3FilesStore(FilesStore):
     if content is False:
       raise FileNotFoundError(f"File {file_path} does not exist")
     
-    # Decrypt content if encryption is enabled
-    decrypted_content = self.decrypt_content(content)
+    # Decrypt content if encryption is enabled, off the event loop
+    if self.is_encrypted:
+      decrypted_content = await asyncio.to_thread(self.decrypt_content, content)
+    else:
+      decrypted_content = content
     
     return decrypted_content, mime_type
 
-  async def list_files(self, folder: str, recursive: bool = False) -> List[FileNode]:
+  async def list_files(self, folder: str, recursive: bool = False, parallel: bool = False) -> List[FileNode]:
     """List the files in the specified folder.
 
     Args:
         folder (str): The folder to list the files from.
         recursive (bool, optional): Whether to list files recursively. Defaults to False.
+        parallel (bool, optional): Whether to list the S3 keys with concurrent requests, for large folders.
+            Defaults to False.
     
     Returns:
         List[FileNode]: The list of file nodes in the folder.
     """
     folder = self.sanitize_path(folder)
     # List all keys in the folder
-    keys = await self.s3_service.list_files(folder)
+    if parallel:
+      keys = await self.s3_service.list_files_parallel(folder)
+    else:
+      keys = await self.s3_service.list_files(folder)
     
     file_nodes = []
     folder_key = self.s3_service.to_s3_key(folder)
-    if not folder_key.endswith("/"):
+    # The bucket root has no separator to strip
+    if folder_key and not folder_key.endswith("/"):
       folder_key += "/"
     
     # Track unique immediate children
     seen_items = set()
-    # Track directories for building hierarchy
-    dir_nodes = {}  # path -> FileNode
+    # Listing entries, in order: path parts and file key, or None for an immediate subfolder
+    entries = []
     
+    prefix_len = len(folder_key)
     for key in keys:
       # Get relative path from folder
-      if key.startswith(folder_key):
-        relative_path = key[len(folder_key):]
-      else:
-        relative_path = key
+      relative_path = key[prefix_len:] if key.startswith(folder_key) else key
       
       # Check if this is a direct child or nested
-      path_parts = relative_path.split("/")
+      head, sep, _ = relative_path.partition("/")
+      if not head:
+        continue  # Skip keys with an empty first component, e.g. with a leading slash
       
-      if len(path_parts) == 1 and path_parts[0]:  # Direct file
-        item_name = path_parts[0]
-        if item_name.endswith(self.meta_extension):
+      if not sep:  # Direct file
+        if head.endswith(self.meta_extension):
           continue  # Skip metadata files
-        if item_name not in seen_items:
-          seen_items.add(item_name)
-          # Get file details from associate metadata file
-          try:
-            node = await self._read_file_node(key)
-            if node:
-              file_nodes.append(node)
-          except Exception as e:
-            logging.warning(f"Could not read metadata for {key}: {e}")
-      elif len(path_parts) > 1 and path_parts[0]:  # Nested content
-        if recursive:
-          # Include all nested files recursively
-          item_name = path_parts[-1]
-          if item_name.endswith(self.meta_extension):
-            continue  # Skip metadata files
-          # Check if this is a file (not a folder marker ending with /)
-          if item_name and not key.endswith("/"):
-            if key not in seen_items:
-              seen_items.add(key)
-              # Get file details from associated metadata file
-              try:
-                node = await self._read_file_node(key)
-                if node:
-                  # Create all intermediate directories and build hierarchy
-                  for i in range(len(path_parts) - 1):
-                    dir_parts = path_parts[:i+1]
-                    dir_name = dir_parts[-1]
-                    dir_relative_path = "/".join(dir_parts)
-                    dir_full_path = f"{folder}/{dir_relative_path}" if folder else dir_relative_path
-                    
-                    if dir_relative_path not in dir_nodes:
-                      # Create new directory node
-                      folder_node = FileNode(
-                        name=dir_name,
-                        path=dir_full_path,
-                        is_file=False,
-                        children=[]
-                      )
-                      dir_nodes[dir_relative_path] = folder_node
-                      
-                      # Add to parent or root
-                      if i == 0:
-                        # Top-level directory
-                        file_nodes.append(folder_node)
-                      else:
-                        # Nested directory - add to parent
-                        parent_path = "/".join(path_parts[:i])
-                        if parent_path in dir_nodes:
-                          dir_nodes[parent_path].children.append(folder_node)
-                  
-                  # Add file to its parent directory
-                  if len(path_parts) > 1:
-                    parent_dir_path = "/".join(path_parts[:-1])
-                    if parent_dir_path in dir_nodes:
-                      dir_nodes[parent_dir_path].children.append(node)
-                  else:
-                    file_nodes.append(node)
-              except Exception as e:
-                logging.warning(f"Could not read metadata for {key}: {e}")
-        else:
-          # Non-recursive: only add immediate subfolder
-          folder_name = path_parts[0]
-          if folder_name not in seen_items:
-            seen_items.add(folder_name)
-            folder_path = f"{folder}/{folder_name}" if folder else folder_name
-            folder_node = FileNode(
-              name=folder_name,
-              path=folder_path,
-              is_file=False
-            )
+        if head not in seen_items:
+          seen_items.add(head)
+          entries.append(((head,), key))
+      elif recursive:  # Nested content
+        # Include all nested files recursively, skipping metadata files and folder markers ending with /
+        if relative_path.endswith(("/", self.meta_extension)):
+          continue
+        if key not in seen_items:
+          seen_items.add(key)
+          entries.append((relative_path.split("/"), key))
+      elif head not in seen_items:
+        # Non-recursive: only add immediate subfolder
+        seen_items.add(head)
+        entries.append(((head,), None))
+    
+    # Get file details from associated metadata, concurrently. The listing tells which
+    # files have a JSON file, so each one needs a single request.
+    key_set = set(keys)
+    semaphore = asyncio.Semaphore(LIST_MAX_CONCURRENCY)
+    
+    async def read_file_node(key: str) -> FileNode:
+      async with semaphore:
+        return await self._read_file_node(key, json_file=f"{key}{self.meta_extension}" in key_set)
+    
+    file_keys = [key for _, key in entries if key is not None]
+    read_nodes = iter(await asyncio.gather(*(read_file_node(key) for key in file_keys), return_exceptions=True))
+    
+    # Track directories for building hierarchy
+    dir_nodes = {}  # path -> FileNode
+    
+    for path_parts, key in entries:
+      if key is None:
+        folder_name = path_parts[0]
+        folder_path = f"{folder}/{folder_name}" if folder else folder_name
+        folder_node = FileNode(
+          name=folder_name,
+          path=folder_path,
+          is_file=False
+        )
+        file_nodes.append(folder_node)
+        continue
+      node = next(read_nodes)
+      if isinstance(node, Exception):
+        logging.warning(f"Could not read metadata for {key}: {node}")
+        continue
+      if not node:
+        continue
+      if len(path_parts) == 1:
+        file_nodes.append(node)
+        continue
+      # Create all intermediate directories and build hierarchy
+      for i in range(len(path_parts) - 1):
+        dir_parts = path_parts[:i+1]
+        dir_name = dir_parts[-1]
+        dir_relative_path = "/".join(dir_parts)
+        dir_full_path = f"{folder}/{dir_relative_path}" if folder else dir_relative_path
+        
+        if dir_relative_path not in dir_nodes:
+          # Create new directory node
+          folder_node = FileNode(
+            name=dir_name,
+            path=dir_full_path,
+            is_file=False,
+            children=[]
+          )
+          dir_nodes[dir_relative_path] = folder_node
+          
+          # Add to parent or root
+          if i == 0:
+            # Top-level directory
             file_nodes.append(folder_node)
+          else:
+            # Nested directory - add to parent
+            parent_path = "/".join(path_parts[:i])
+            if parent_path in dir_nodes:
+              dir_nodes[parent_path].children.append(folder_node)
+      
+      # Add file to its parent directory
+      parent_dir_path = "/".join(path_parts[:-1])
+      if parent_dir_path in dir_nodes:
+        dir_nodes[parent_dir_path].children.append(node)
     
     return file_nodes
 
@@ -843,6 +1225,9 @@ class S3FilesStore(FilesStore):
         bool: True if the path exists, False otherwise.
     """
     path = self.sanitize_path(path)
+    # A file whose metadata was recently read exists, unless written or deleted since
+    if self._node_cache and self._get_cached_file_node(self.s3_service.to_s3_key(path)) is not None:
+      return True
     return await self.s3_service.path_exists(path)
 
   async def copy_file(self, source_path: str, destination_path: str) -> bool:
@@ -858,11 +1243,14 @@ class S3FilesStore(FilesStore):
     try:
       source_path = self.sanitize_path(source_path)
       destination_path = self.sanitize_path(destination_path)
-      result = await self.s3_service.copy_file(source_path, destination_path)
-      if result is not False:
+      # Object metadata is copied along with the object, JSON files are not
+      node, from_json = await self._head_file_node(source_path)
+      copy_kwargs = self._migrate_file_node(node) if from_json else {}
+      result = await self.s3_service.copy_file(source_path, destination_path, **copy_kwargs)
+      self._forget_file_nodes(destination_path)
+      if result is not False and from_json and not copy_kwargs:
         # Copy metadata file as well
         try:
-          node = await self._read_file_node(source_path)
           if node:
             node.path = destination_path
             await self._dump_file_node(node, os.path.dirname(destination_path))
@@ -886,12 +1274,19 @@ class S3FilesStore(FilesStore):
     try:
       source_path = self.sanitize_path(source_path)
       destination_path = self.sanitize_path(destination_path)
-      result = await self.s3_service.move_file(source_path, destination_path)
-      if result is not False:
+      # Object metadata is moved along with the object, JSON files are not
+      node, from_json = await self._head_file_node(source_path)
+      move_kwargs = self._migrate_file_node(node) if from_json else {}
+      result = await self.s3_service.move_file(source_path, destination_path, **move_kwargs)
+      self._forget_file_nodes(source_path)
+      self._forget_file_nodes(destination_path)
+      if result is not False and from_json:
         # Move metadata file as well
         try:
-          node = await self._read_file_node(source_path)
-          if node:
+          if move_kwargs:
+            # Delete old metadata file, now in the object metadata
+            await self._delete_file_node(source_path)
+          elif node:
             node.name = os.path.basename(destination_path)
             node.path = destination_path
             await self._dump_file_node(node, os.path.dirname(destination_path))
@@ -916,11 +1311,12 @@ class S3FilesStore(FilesStore):
     file_path = self.sanitize_path(file_path)
     try:
       # Check if it's a file or folder by trying to read its metadata
-      node = await self._read_file_node(file_path)
+      node, from_json = await self._head_file_node(file_path)
+      self._forget_file_nodes(file_path)
       if node and node.is_file:
         # It's a file
         result = await self.s3_service.delete_file(file_path)
-        if result is not False:
+        if result is not False and from_json:
           await self._delete_file_node(file_path)
         return result is not False
       else:
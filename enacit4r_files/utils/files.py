@@ -2,6 +2,7 @@ from fastapi.exceptions import HTTPException
 from fastapi.datastructures import UploadFile
 from enacit4r_files.models.files import FileRef, FileNode
 from urllib.parse import quote
+import mimetypes
 
 # 100 MB in binary
 DEFAULT_MAX_FILE_SIZE = 100 * 1024 * 1024
@@ -24,6 +25,26 @@ image_mimetypes: list[str] = png_mimetypes + \
     jpg_mimetypes + gif_mimetypes + other_images
 zip_mimetypes: list[str] = ["application/zip", "application/x-zip-compressed"]
 
+# extension to mime type lookup table, built once from the system mime types
+mimetypes.init()
+_EXT_MIME: dict[str, str] = {
+    ext.lower(): mime_type for ext, mime_type in mimetypes.types_map.items()}
+
+
+def guess_mime_type(file_name: str) -> str | None:
+    """Guess the mime type of a file from its extension.
+
+    Args:
+        file_name (str): The file name or path.
+
+    Returns:
+        str | None: The mime type, or None if the extension is unknown.
+    """
+    dot = file_name.rfind(".")
+    if dot <= file_name.rfind("/"):
+        return None
+    return _EXT_MIME.get(file_name[dot:].lower())
+
 
 class FileChecker:
     """A class that checks the size of files
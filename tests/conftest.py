@@ -0,0 +1,31 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import pytest
+
+
+# Prefer a memory-backed file system (tmpfs) for test files, unless overridden
+TEST_TMPDIR = os.environ.get("TEST_TMPDIR", "/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+
+@pytest.fixture(scope="session")
+def session_dir(tmp_path_factory):
+    """Create a temporary directory shared by all tests, removed at the end of the session."""
+    if TEST_TMPDIR is None:
+        # No tmpfs available, use pytest's own temporary directory
+        yield str(tmp_path_factory.mktemp("enacit4r"))
+        return
+    session_path = tempfile.mkdtemp(prefix="enacit4r-", dir=TEST_TMPDIR)
+    yield session_path
+    shutil.rmtree(session_path, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def event_loop_policy():
+    """Run async tests on uvloop when it is installed, else on the default asyncio loop."""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.DefaultEventLoopPolicy()
+    return uvloop.EventLoopPolicy()
@@ -1,22 +1,56 @@
+import asyncio
+import functools
+import os
 import pytest
 import tempfile
-import shutil
 import json
 from pathlib import Path
 from io import BytesIO
+from unittest.mock import patch
+from uuid import uuid4
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet
 from fastapi.datastructures import UploadFile
 from enacit4r_files.services import LocalFilesStore, FileNode
 
 
+# Run all tests in a single event loop
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+# Shared 1 MB content for large file tests
+_LARGE_1MB = b"X" * (1 << 20)
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_meta(path_str: str, mtime_ns: int, ino: int) -> dict:
+    """Parse a metadata JSON file, once per file version."""
+    return json.loads(Path(path_str).read_bytes())
+
+
+def _read_meta(meta_path) -> dict:
+    """Load a metadata JSON file. Rewrites replace the file (new inode/mtime), which invalidates the cache."""
+    meta_path = os.fspath(meta_path)
+    stat = os.stat(meta_path)
+    return dict(_cached_meta(meta_path, stat.st_mtime_ns, stat.st_ino))
+
+
+def _names_in(dir_path: Path) -> set:
+    """List the names of the entries of a directory, with a single scan."""
+    with os.scandir(dir_path) as entries:
+        return {entry.name for entry in entries}
+
+
+def make_upload(name: str, data: bytes) -> UploadFile:
+    """Create an UploadFile from in-memory content."""
+    return UploadFile(filename=name, file=BytesIO(data))
+
+
 @pytest.fixture
-def temp_dir():
-    """Create a temporary directory for testing."""
-    temp_path = tempfile.mkdtemp()
-    yield temp_path
-    # Cleanup after test
-    if Path(temp_path).exists():
-        shutil.rmtree(temp_path)
+def temp_dir(session_dir):
+    """Create a unique temporary directory for testing."""
+    temp_path = os.path.join(session_dir, uuid4().hex)
+    os.mkdir(temp_path)
+    return temp_path
 
 
 @pytest.fixture
@@ -32,15 +66,19 @@ def sample_file(temp_dir):
     file_path.write_text("Sample content")
     return str(file_path)
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def fernet_key():
-    """Generate a Fernet key for encryption tests."""
+    """Generate a Fernet key for encryption tests, once per session."""
     return Fernet.generate_key()
 
+@pytest.fixture(scope="session")
+def fernet(fernet_key):
+    """Create a Fernet cipher with the test key, to encrypt or decrypt content manually."""
+    return Fernet(fernet_key)
+
 class TestLocalFilesStore:
     """Test suite for LocalFilesStore."""
 
-    @pytest.mark.asyncio
     async def test_init_creates_base_path(self):
         """Test that initialization creates the base path."""
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -49,14 +87,10 @@ class TestLocalFilesStore:
             assert non_existent.exists()
             assert service.base_path == non_existent.resolve()
 
-    @pytest.mark.asyncio
     async def test_write_file(self, local_service):
         """Test writing a file via UploadFile."""
         content = b"Test file content"
-        upload_file = UploadFile(
-            filename="test.txt",
-            file=BytesIO(content)
-        )
+        upload_file = make_upload("test.txt", content)
         
         result = await local_service.write_file(upload_file, folder="uploads")
         
@@ -72,14 +106,10 @@ class TestLocalFilesStore:
         assert file_path.exists()
         assert file_path.read_bytes() == content
 
-    @pytest.mark.asyncio
     async def test_upload_file_to_root(self, local_service):
         """Test writing a file to the root folder."""
         content = b"Root file content"
-        upload_file = UploadFile(
-            filename="root.txt",
-            file=BytesIO(content)
-        )
+        upload_file = make_upload("root.txt", content)
         
         result = await local_service.write_file(upload_file)
         
@@ -87,7 +117,6 @@ class TestLocalFilesStore:
         assert result.path == "root.txt"
         assert result.is_file is True
 
-    @pytest.mark.asyncio
     async def test_write_local_file(self, local_service, sample_file):
         """Test writing a local file."""
         result = await local_service.write_local_file(sample_file, folder="docs")
@@ -103,13 +132,11 @@ class TestLocalFilesStore:
         assert dest_path.exists()
         assert dest_path.read_text() == "Sample content"
 
-    @pytest.mark.asyncio
     async def test_write_local_file_not_found(self, local_service):
         """Test writing a non-existent local file."""
         with pytest.raises(FileNotFoundError):
             await local_service.write_local_file("/non/existent/file.txt")
 
-    @pytest.mark.asyncio
     async def test_get_file(self, local_service):
         """Test retrieving a file."""
         # Create a test file
@@ -122,28 +149,42 @@ class TestLocalFilesStore:
         assert content == test_content
         assert mime_type == "text/plain"
 
-    @pytest.mark.asyncio
     async def test_get_file_not_found(self, local_service):
         """Test retrieving a non-existent file."""
         with pytest.raises(FileNotFoundError):
             await local_service.get_file("nonexistent.txt")
 
-    @pytest.mark.asyncio
+    async def test_iter_file(self, local_service):
+        """Test iterating over a file content in chunks."""
+        test_path = local_service.base_path / "chunks.txt"
+        test_content = b"0123456789" * 10
+        test_path.write_bytes(test_content)
+        
+        chunks = [chunk async for chunk in local_service.iter_file("chunks.txt", chunk_size=32)]
+        
+        assert [len(chunk) for chunk in chunks] == [32, 32, 32, 4]
+        assert b"".join(chunks) == test_content
+
+    async def test_iter_file_not_found(self, local_service):
+        """Test iterating over a non-existent file."""
+        with pytest.raises(FileNotFoundError):
+            async for _ in local_service.iter_file("nonexistent.txt"):
+                pass
+
     async def test_list_files_empty(self, local_service):
         """Test listing files in an empty directory."""
         result = await local_service.list_files("")
         assert result == []
 
-    @pytest.mark.asyncio
     async def test_list_files(self, local_service):
         """Test listing files in a directory."""
         # Create some test files using upload method
-        await local_service.write_file(UploadFile(filename="file1.txt", file=BytesIO(b"content1")))
-        await local_service.write_file(UploadFile(filename="file2.txt", file=BytesIO(b"content2")))
+        await local_service.write_file(make_upload("file1.txt", b"content1"))
+        await local_service.write_file(make_upload("file2.txt", b"content2"))
         
         # Create a subdirectory with a file
         (local_service.base_path / "subdir").mkdir()
-        await local_service.write_file(UploadFile(filename="file3.txt", file=BytesIO(b"content3")), folder="subdir")
+        await local_service.write_file(make_upload("file3.txt", b"content3"), folder="subdir")
         
         result = await local_service.list_files("")
         
@@ -161,17 +202,16 @@ class TestLocalFilesStore:
         assert len(dirs) == 1
         assert dirs[0].name == "subdir"
     
-    @pytest.mark.asyncio
     async def test_list_files_recursively(self, local_service):
         """Test listing files recursively in a directory."""
         # Create some test files using upload method
-        await local_service.write_file(UploadFile(filename="file1.txt", file=BytesIO(b"content1")))
-        await local_service.write_file(UploadFile(filename="file2.txt", file=BytesIO(b"content2")))
+        await local_service.write_file(make_upload("file1.txt", b"content1"))
+        await local_service.write_file(make_upload("file2.txt", b"content2"))
         
         # Create a subdirectory with files
         (local_service.base_path / "subdir").mkdir()
-        await local_service.write_file(UploadFile(filename="file3.txt", file=BytesIO(b"content3")), folder="subdir")
-        await local_service.write_file(UploadFile(filename="file4.txt", file=BytesIO(b"content4")), folder="subdir")
+        await local_service.write_file(make_upload("file3.txt", b"content3"), folder="subdir")
+        await local_service.write_file(make_upload("file4.txt", b"content4"), folder="subdir")
         
         result = await local_service.list_files("", recursive=True)
         
@@ -194,12 +234,11 @@ class TestLocalFilesStore:
         assert "file3.txt" in subdir_file_names
         assert "file4.txt" in subdir_file_names
 
-    @pytest.mark.asyncio
     async def test_list_files_in_subfolder(self, local_service):
         """Test listing files in a subfolder."""
         # Create files using upload method
-        await local_service.write_file(UploadFile(filename="file1.txt", file=BytesIO(b"content1")), folder="subdir")
-        await local_service.write_file(UploadFile(filename="file2.txt", file=BytesIO(b"content2")), folder="subdir")
+        await local_service.write_file(make_upload("file1.txt", b"content1"), folder="subdir")
+        await local_service.write_file(make_upload("file2.txt", b"content2"), folder="subdir")
         
         result = await local_service.list_files("subdir")
         
@@ -208,13 +247,21 @@ class TestLocalFilesStore:
         file_names = {node.name for node in result}
         assert file_names == {"file1.txt", "file2.txt"}
 
-    @pytest.mark.asyncio
+    async def test_list_files_with_temporary_suffix(self, local_service):
+        """Test that files named like temporary files are listed, unlike temporary metadata files."""
+        await local_service.write_file(make_upload("report.tmp-2024.txt", b"report"), folder="a")
+        # A metadata file being written by another process
+        (local_service.base_path / "a" / f"other.txt{local_service.meta_extension}.tmp-123-456").write_bytes(b"{}")
+
+        result = await local_service.list_files("a")
+
+        assert [node.name for node in result] == ["report.tmp-2024.txt"]
+
     async def test_list_files_nonexistent_folder(self, local_service):
         """Test listing files in a non-existent folder."""
         result = await local_service.list_files("nonexistent")
         assert result == []
 
-    @pytest.mark.asyncio
     async def test_file_exists_file(self, local_service):
         """Test checking if a file exists."""
         # Create a test file
@@ -224,7 +271,6 @@ class TestLocalFilesStore:
         assert await local_service.file_exists("exists.txt") is True
         assert await local_service.file_exists("notexists.txt") is False
 
-    @pytest.mark.asyncio
     async def test_file_exists_directory(self, local_service):
         """Test checking if a directory exists."""
         test_dir = local_service.base_path / "testdir"
@@ -232,13 +278,11 @@ class TestLocalFilesStore:
         
         assert await local_service.file_exists("testdir") is True
 
-    @pytest.mark.asyncio
     async def test_file_exists_invalid_path(self, local_service):
         """Test checking an invalid path."""
         # Path traversal attempt should return False
         assert await local_service.file_exists("../../etc/passwd") is False
 
-    @pytest.mark.asyncio
     async def test_copy_file(self, local_service):
         """Test copying a file."""
         # Create source file
@@ -250,12 +294,10 @@ class TestLocalFilesStore:
         assert result is True
         
         # Verify both files exist
-        assert source_path.exists()
         dest_path = local_service.base_path / "destination.txt"
-        assert dest_path.exists()
+        assert {"source.txt", "destination.txt"} <= _names_in(local_service.base_path)
         assert dest_path.read_text() == "Source content"
 
-    @pytest.mark.asyncio
     async def test_copy_file_to_subfolder(self, local_service):
         """Test copying a file to a subfolder."""
         # Create source file
@@ -271,13 +313,11 @@ class TestLocalFilesStore:
         assert dest_path.exists()
         assert dest_path.read_text() == "Source content"
 
-    @pytest.mark.asyncio
     async def test_copy_file_not_found(self, local_service):
         """Test copying a non-existent file."""
         result = await local_service.copy_file("nonexistent.txt", "destination.txt")
         assert result is False
 
-    @pytest.mark.asyncio
     async def test_move_file(self, local_service):
         """Test moving a file."""
         # Create source file
@@ -296,7 +336,6 @@ class TestLocalFilesStore:
         assert dest_path.exists()
         assert dest_path.read_text() == "Source content"
 
-    @pytest.mark.asyncio
     async def test_move_file_to_subfolder(self, local_service):
         """Test moving a file to a subfolder."""
         # Create source file
@@ -311,13 +350,11 @@ class TestLocalFilesStore:
         dest_path = local_service.base_path / "subfolder" / "destination.txt"
         assert dest_path.exists()
 
-    @pytest.mark.asyncio
     async def test_move_file_not_found(self, local_service):
         """Test moving a non-existent file."""
         result = await local_service.move_file("nonexistent.txt", "destination.txt")
         assert result is False
 
-    @pytest.mark.asyncio
     async def test_delete_file(self, local_service):
         """Test deleting a file."""
         # Create test file
@@ -329,7 +366,6 @@ class TestLocalFilesStore:
         assert result is True
         assert not test_path.exists()
 
-    @pytest.mark.asyncio
     async def test_delete_directory(self, local_service):
         """Test deleting a directory."""
         # Create test directory with file
@@ -342,19 +378,74 @@ class TestLocalFilesStore:
         assert result is True
         assert not test_dir.exists()
 
-    @pytest.mark.asyncio
+    async def test_write_file_after_folder_deleted(self, local_service):
+        """Test writing to a folder that was removed since the last write."""
+        await local_service.write_file(make_upload("a.txt", b"a"), folder="tmp/sub")
+        # Deleting the only file also removes its folder
+        assert await local_service.delete_file("tmp/sub/a.txt")
+        assert not (local_service.base_path / "tmp" / "sub").exists()
+        
+        result = await local_service.write_file(make_upload("b.txt", b"b"), folder="tmp/sub")
+        assert result.path == "tmp/sub/b.txt"
+        
+        assert await local_service.delete_file("tmp")
+        result = await local_service.write_file(make_upload("c.txt", b"c"), folder="tmp/sub")
+        assert result.path == "tmp/sub/c.txt"
+
+    async def test_write_file_after_folder_deleted_by_other_store(self, local_service):
+        """Test writing to a known folder that another store removed meanwhile."""
+        other_service = LocalFilesStore(base_path=str(local_service.base_path))
+        await local_service.write_file(make_upload("x.txt", b"x"), folder="docs")
+        assert await other_service.delete_file("docs/x.txt")
+        assert not (local_service.base_path / "docs").exists()
+        
+        result = await local_service.write_file(make_upload("y.txt", b"y"), folder="docs")
+        assert result.path == "docs/y.txt"
+        
+        source_path = local_service.base_path / "local.txt"
+        source_path.write_bytes(b"local")
+        assert await other_service.delete_file("docs/y.txt")
+        result = await local_service.write_local_file(str(source_path), folder="docs")
+        assert result.path == "docs/local.txt"
+        assert (local_service.base_path / "docs" / "local.txt").read_bytes() == b"local"
+
+    async def test_mkdir_once_per_folder(self, local_service):
+        """Test that folders are created once, then known to exist."""
+        with patch("enacit4r_files.services.local.os.makedirs", wraps=os.makedirs) as makedirs:
+            await local_service.write_file(make_upload("a.txt", b"a"), folder="sub/dir/path")
+            # os.makedirs also calls itself for the missing parent folders
+            call_count = makedirs.call_count
+            await local_service.write_file(make_upload("b.txt", b"b"), folder="sub/dir/path")
+            await local_service.write_file(make_upload("c.txt", b"c"), folder="sub/dir")
+            assert await local_service.copy_file("sub/dir/path/a.txt", "sub/copy.txt")
+            assert makedirs.call_count == call_count
+        
+        assert (local_service.base_path / "sub" / "copy.txt").read_bytes() == b"a"
+
+    async def test_copy_and_move_after_folder_deleted_by_other_store(self, local_service):
+        """Test copying and moving to a known folder that another store removed meanwhile."""
+        other_service = LocalFilesStore(base_path=str(local_service.base_path))
+        await local_service.write_file(make_upload("a.txt", b"a"))
+        await local_service.write_file(make_upload("x.txt", b"x"), folder="docs")
+        assert await other_service.delete_file("docs/x.txt")
+        
+        assert await local_service.copy_file("a.txt", "docs/copy.txt")
+        assert (local_service.base_path / "docs" / "copy.txt").read_bytes() == b"a"
+        
+        assert await other_service.delete_file("docs/copy.txt")
+        assert await local_service.move_file("a.txt", "docs/moved.txt")
+        assert (local_service.base_path / "docs" / "moved.txt").read_bytes() == b"a"
+
     async def test_delete_file_not_found(self, local_service):
         """Test deleting a non-existent file."""
         result = await local_service.delete_file("nonexistent.txt")
         assert result is False
 
-    @pytest.mark.asyncio
     async def test_security_path_traversal(self, local_service):
         """Test that path traversal attempts are blocked."""
         with pytest.raises(ValueError, match="Invalid path: '..' not allowed"):
             local_service._get_full_path("../../etc/passwd")
 
-    @pytest.mark.asyncio
     async def test_mime_type_detection(self, local_service):
         """Test MIME type detection for various file types."""
         # Create files with different extensions
@@ -376,16 +467,12 @@ class TestLocalFilesStore:
 class TestLocalFilesStoreWithEncryption:
     """Test suite for LocalFilesStore with Fernet encryption."""
 
-    @pytest.mark.asyncio
-    async def test_upload_file_with_encryption(self, temp_dir, fernet_key):
+    async def test_upload_file_with_encryption(self, temp_dir, fernet_key, fernet):
         """Test writing a file with encryption enabled."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
         
         content = b"Secret file content"
-        upload_file = UploadFile(
-            filename="encrypted.txt",
-            file=BytesIO(content)
-        )
+        upload_file = make_upload("encrypted.txt", content)
         
         result = await service.write_file(upload_file, folder="secure")
         
@@ -402,18 +489,15 @@ class TestLocalFilesStoreWithEncryption:
         assert raw_content != content  # Content should be encrypted
         
         # Decrypt manually to verify
-        fernet = Fernet(fernet_key)
         decrypted = fernet.decrypt(raw_content)
         assert decrypted == content
 
-    @pytest.mark.asyncio
-    async def test_get_file_with_encryption(self, temp_dir, fernet_key):
+    async def test_get_file_with_encryption(self, temp_dir, fernet_key, fernet):
         """Test retrieving an encrypted file."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
         
         # Create and encrypt a file
         original_content = b"Secret content"
-        fernet = Fernet(fernet_key)
         encrypted_content = fernet.encrypt(original_content)
         
         test_path = service.base_path / "encrypted.txt"
@@ -425,8 +509,7 @@ class TestLocalFilesStoreWithEncryption:
         assert content == original_content
         assert mime_type == "text/plain"
 
-    @pytest.mark.asyncio
-    async def test_write_local_file_with_encryption(self, temp_dir, fernet_key):
+    async def test_write_local_file_with_encryption(self, temp_dir, fernet_key, fernet):
         """Test writing a local file with encryption."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
         
@@ -446,21 +529,16 @@ class TestLocalFilesStoreWithEncryption:
         assert encrypted_disk_content != original_content
         
         # Verify decryption works
-        fernet = Fernet(fernet_key)
         decrypted = fernet.decrypt(encrypted_disk_content)
         assert decrypted == original_content
 
-    @pytest.mark.asyncio
     async def test_round_trip_with_encryption(self, temp_dir, fernet_key):
         """Test writing and retrieving a file with encryption."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
         
         # Upload a file
         original_content = b"Round trip test content"
-        upload_file = UploadFile(
-            filename="roundtrip.txt",
-            file=BytesIO(original_content)
-        )
+        upload_file = make_upload("roundtrip.txt", original_content)
         
         await service.write_file(upload_file)
         
@@ -471,17 +549,13 @@ class TestLocalFilesStoreWithEncryption:
         assert retrieved_content == original_content
         assert mime_type == "text/plain"
 
-    @pytest.mark.asyncio
     async def test_encryption_with_binary_file(self, temp_dir, fernet_key):
         """Test encryption with binary file content."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
         
         # Create binary content (simulating an image or other binary file)
         binary_content = bytes(range(256))
-        upload_file = UploadFile(
-            filename="binary.bin",
-            file=BytesIO(binary_content)
-        )
+        upload_file = make_upload("binary.bin", binary_content)
         
         await service.write_file(upload_file)
         
@@ -489,17 +563,13 @@ class TestLocalFilesStoreWithEncryption:
         retrieved_content, _ = await service.get_file("binary.bin")
         assert retrieved_content == binary_content
 
-    @pytest.mark.asyncio
     async def test_encryption_with_large_content(self, temp_dir, fernet_key):
         """Test encryption with larger file content."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
         
         # Create a larger content (1MB)
-        large_content = b"X" * (1024 * 1024)
-        upload_file = UploadFile(
-            filename="large.txt",
-            file=BytesIO(large_content)
-        )
+        large_content = _LARGE_1MB
+        upload_file = make_upload("large.txt", large_content)
         
         await service.write_file(upload_file)
         
@@ -508,7 +578,19 @@ class TestLocalFilesStoreWithEncryption:
         assert retrieved_content == large_content
         assert len(retrieved_content) == len(large_content)
 
-    @pytest.mark.asyncio
+    async def test_iter_file_with_encryption(self, temp_dir, fernet_key):
+        """Test iterating over an encrypted file content in chunks."""
+        service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
+        
+        original_content = b"Y" * 1000
+        upload_file = make_upload("chunks.txt", original_content)
+        await service.write_file(upload_file)
+        
+        chunks = [chunk async for chunk in service.iter_file("chunks.txt", chunk_size=256)]
+        
+        assert [len(chunk) for chunk in chunks] == [256, 256, 256, 232]
+        assert b"".join(chunks) == original_content
+
     async def test_multiple_files_with_encryption(self, temp_dir, fernet_key):
         """Test writing and retrieving multiple encrypted files."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
@@ -520,29 +602,24 @@ class TestLocalFilesStoreWithEncryption:
             "file3.txt": b"Content 3",
         }
         
-        for filename, content in files.items():
-            upload_file = UploadFile(
-                filename=filename,
-                file=BytesIO(content)
-            )
-            await service.write_file(upload_file)
+        nodes = await service.write_files([
+            make_upload(filename, content)
+            for filename, content in files.items()
+        ])
+        assert [node.name for node in nodes] == list(files.keys())
         
         # Retrieve and verify each file
         for filename, expected_content in files.items():
             retrieved_content, _ = await service.get_file(filename)
             assert retrieved_content == expected_content
 
-    @pytest.mark.asyncio
     async def test_copy_encrypted_file(self, temp_dir, fernet_key):
         """Test copying an encrypted file."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
         
         # Create an encrypted file
         original_content = b"Copy this encrypted content"
-        upload_file = UploadFile(
-            filename="source.txt",
-            file=BytesIO(original_content)
-        )
+        upload_file = make_upload("source.txt", original_content)
         await service.write_file(upload_file)
         
         # Copy the file
@@ -556,17 +633,13 @@ class TestLocalFilesStoreWithEncryption:
         assert source_content == original_content
         assert copy_content == original_content
 
-    @pytest.mark.asyncio
     async def test_move_encrypted_file(self, temp_dir, fernet_key):
         """Test moving an encrypted file."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
         
         # Create an encrypted file
         original_content = b"Move this encrypted content"
-        upload_file = UploadFile(
-            filename="source.txt",
-            file=BytesIO(original_content)
-        )
+        upload_file = make_upload("source.txt", original_content)
         await service.write_file(upload_file)
         
         # Move the file
@@ -580,18 +653,15 @@ class TestLocalFilesStoreWithEncryption:
         moved_content, _ = await service.get_file("moved.txt")
         assert moved_content == original_content
 
-    @pytest.mark.asyncio
     async def test_list_encrypted_files(self, temp_dir, fernet_key):
         """Test listing encrypted files."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
         
         # Create multiple encrypted files
-        for i in range(3):
-            upload_file = UploadFile(
-                filename=f"file{i}.txt",
-                file=BytesIO(f"Content {i}".encode())
-            )
-            await service.write_file(upload_file)
+        await service.write_files([
+            make_upload(f"file{i}.txt", f"Content {i}".encode())
+            for i in range(3)
+        ])
         
         # List files (now reads from .meta files only, so no need to filter)
         result = await service.list_files("")
@@ -600,7 +670,6 @@ class TestLocalFilesStoreWithEncryption:
         file_names = {node.name for node in result}
         assert file_names == {"file0.txt", "file1.txt", "file2.txt"}
 
-    @pytest.mark.asyncio
     async def test_encryption_methods_directly(self, fernet_key):
         """Test encrypt and decrypt methods directly."""
         service = LocalFilesStore(base_path=".", key=fernet_key)
@@ -616,16 +685,58 @@ class TestLocalFilesStoreWithEncryption:
         decrypted = service.decrypt_content(encrypted)
         assert decrypted == original_content
 
-    @pytest.mark.asyncio
+    async def test_round_trip_with_aesgcm_encryption(self, temp_dir, fernet_key):
+        """Test writing and retrieving a file with AES-GCM encryption."""
+        service = LocalFilesStore(base_path=temp_dir, key=fernet_key, use_aesgcm=True)
+        assert service.fernet is None
+        assert service.is_encrypted
+        
+        original_content = b"AES-GCM round trip content"
+        upload_file = make_upload("aesgcm.txt", original_content)
+        
+        result = await service.write_file(upload_file)
+        assert result.size == len(original_content)
+        
+        # Raw content is the nonce followed by the ciphertext and the tag, no base64 expansion
+        raw_content = (service.base_path / "aesgcm.txt").read_bytes()
+        assert raw_content != original_content
+        assert len(raw_content) == len(original_content) + 12 + 16
+        
+        retrieved_content, mime_type = await service.get_file("aesgcm.txt")
+        assert retrieved_content == original_content
+        assert mime_type == "text/plain"
+
+    async def test_aesgcm_decryption_with_other_key_fails(self, temp_dir, fernet_key):
+        """Test that AES-GCM encrypted content cannot be decrypted with another key."""
+        service = LocalFilesStore(base_path=temp_dir, key=fernet_key, use_aesgcm=True)
+        other_service = LocalFilesStore(base_path=temp_dir, key=Fernet.generate_key(), use_aesgcm=True)
+        
+        encrypted = service.encrypt_content(b"Secret")
+        
+        with pytest.raises(InvalidTag):
+            other_service.decrypt_content(encrypted)
+
+    async def test_invalid_key_fails_on_init(self, temp_dir):
+        """Test that an invalid Fernet key is rejected when the store is created."""
+        with pytest.raises(ValueError):
+            LocalFilesStore(base_path=temp_dir, key=b"bad")
+
+    async def test_fernet_assignable(self, temp_dir, fernet):
+        """Test that the Fernet cipher of a store can be replaced."""
+        service = LocalFilesStore(base_path=temp_dir)
+        assert not service.is_encrypted
+        
+        service.fernet = fernet
+        
+        assert service.is_encrypted
+        assert fernet.decrypt(service.encrypt_content(b"Secret")) == b"Secret"
+
     async def test_no_encryption_when_key_not_provided(self, temp_dir):
         """Test that files are not encrypted when no key is provided."""
         service = LocalFilesStore(base_path=temp_dir, key=None)
         
         original_content = b"Unencrypted content"
-        upload_file = UploadFile(
-            filename="plain.txt",
-            file=BytesIO(original_content)
-        )
+        upload_file = make_upload("plain.txt", original_content)
         
         await service.write_file(upload_file)
         
@@ -634,17 +745,13 @@ class TestLocalFilesStoreWithEncryption:
         raw_content = file_path.read_bytes()
         assert raw_content == original_content  # No encryption
 
-    @pytest.mark.asyncio
     async def test_encryption_with_special_characters(self, temp_dir, fernet_key):
         """Test encryption with special characters and unicode."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
         
         # Content with special characters
         special_content = "Hello 世界! 🌍 Special: @#$%^&*()".encode('utf-8')
-        upload_file = UploadFile(
-            filename="special.txt",
-            file=BytesIO(special_content)
-        )
+        upload_file = make_upload("special.txt", special_content)
         
         await service.write_file(upload_file)
         
@@ -653,38 +760,69 @@ class TestLocalFilesStoreWithEncryption:
         assert retrieved_content == special_content
 
 
+# Metadata file locations after copying or moving to a subfolder, relative to the base path
+SUBFOLDER_COPY_META = ("subfolder", "destination.txt.meta.json")
+SUBFOLDER_MOVE_META = ("subfolder", "moved.txt.meta.json")
+
+# Full metadata of an uploaded file, with all optional fields unset
+FILE_META = {
+    "name": None, "path": None, "size": None, "mime_type": None,
+    "alt_name": None, "alt_path": None, "alt_size": None, "alt_mime_type": None,
+    "is_file": True, "children": [],
+}
+
+# Uploaded files and their expected metadata fields, besides name, size and is_file
+METADATA_CASES = [
+    ("test_meta.txt", "metadata_test", b"Test content for metadata",
+     {"path": "metadata_test/test_meta.txt", "mime_type": "text/plain"}),
+    ("simple.txt", "", b"content",
+     {"path": "simple.txt", "mime_type": "text/plain"}),
+    ("with.dots.in.name.csv", "", b"content",
+     {"path": "with.dots.in.name.csv", "mime_type": "text/csv"}),
+    ("no_extension", "", b"content",
+     {"path": "no_extension", "mime_type": None}),
+    ("complete.json", "complete", b"Complete metadata test",
+     {"path": "complete/complete.json", "mime_type": "application/json"}),
+    ("subdir_file.txt", "sub/dir/path", b"Subdirectory test",
+     {"path": "sub/dir/path/subdir_file.txt", "mime_type": "text/plain"}),
+]
+
+
 class TestMetadataFiles:
     """Test suite for JSON metadata files that are dumped alongside managed files."""
 
-    @pytest.mark.asyncio
-    async def test_upload_file_creates_metadata(self, local_service):
-        """Test that uploading a file creates a corresponding metadata JSON file."""
-        content = b"Test content for metadata"
-        upload_file = UploadFile(
-            filename="test_meta.txt",
-            file=BytesIO(content)
-        )
-        
-        result = await local_service.write_file(upload_file, folder="metadata_test")
-        assert result is not None
-        assert isinstance(result, FileNode)
+    @pytest.mark.parametrize("filename,folder,content,expected", METADATA_CASES)
+    async def test_upload_file_creates_metadata(self, local_service, filename, folder, content, expected):
+        """Test that uploading a file creates a valid <filename>.meta.json file with all FileNode fields."""
+        result = await local_service.write_file(make_upload(filename, content), folder=folder)
+        assert type(result) is FileNode
         
         # Verify metadata file exists
-        file_path = local_service.base_path / "metadata_test" / "test_meta.txt"
-        meta_path = file_path.with_suffix(file_path.suffix + local_service.meta_extension)
-        assert meta_path.exists()
-        
-        # Verify metadata content
-        with open(meta_path, "r") as f:
-            metadata = json.load(f)
+        file_path = local_service.base_path / folder / filename
+        meta_path = file_path.parent / (filename + local_service.meta_extension)
+        assert meta_path.exists(), f"Metadata file not found for {filename}"
         
-        assert metadata["name"] == "test_meta.txt"
-        assert metadata["path"] == "metadata_test/test_meta.txt"
-        assert metadata["size"] == len(content)
-        assert metadata["mime_type"] == "text/plain"
-        assert metadata["is_file"] is True
+        # Verify the returned node, and that the metadata file holds the same node
+        assert result.model_dump() == {**FILE_META, "name": filename, "size": len(content), **expected}
+        assert _read_meta(meta_path) == result.model_dump()
+
+    async def test_concurrent_uploads_create_metadata(self, local_service):
+        """Test that files uploaded concurrently each get their own metadata file."""
+        folders = {}
+        for filename, folder, content, expected in METADATA_CASES:
+            folders.setdefault(folder, []).append(make_upload(filename, content))
+        results = await asyncio.gather(*[
+            local_service.write_files(uploads, folder=folder) for folder, uploads in folders.items()
+        ])
+        nodes = {node.path: node for result in results for node in result}
+        
+        for filename, folder, content, expected in METADATA_CASES:
+            meta_path = local_service.base_path / folder / (filename + local_service.meta_extension)
+            metadata = _read_meta(meta_path)
+            assert metadata == nodes[expected["path"]].model_dump()
+            assert metadata["size"] == len(content)
+            assert metadata["mime_type"] == expected["mime_type"]
 
-    @pytest.mark.asyncio
     async def test_write_local_file_creates_metadata(self, local_service, sample_file):
         """Test that uploading a local file creates metadata JSON file."""
         await local_service.write_local_file(sample_file, folder="local_meta")
@@ -695,46 +833,16 @@ class TestMetadataFiles:
         assert meta_path.exists()
         
         # Verify metadata content
-        with open(meta_path, "r") as f:
-            metadata = json.load(f)
+        metadata = _read_meta(meta_path)
         
         assert metadata["name"] == "sample.txt"
         assert metadata["path"] == "local_meta/sample.txt"
         assert metadata["is_file"] is True
 
-    @pytest.mark.asyncio
-    async def test_metadata_file_naming(self, local_service):
-        """Test that metadata files are named correctly with .meta extension."""
-        test_files = [
-            "simple.txt",
-            "with.dots.in.name.csv",
-            "no_extension",
-        ]
-        
-        for filename in test_files:
-            upload_file = UploadFile(
-                filename=filename,
-                file=BytesIO(b"content")
-            )
-            await local_service.write_file(upload_file)
-            
-            file_path = local_service.base_path / filename
-            # Metadata file should be <filename>.<extension>.meta
-            if "." in filename:
-                expected_meta = file_path.parent / (filename + local_service.meta_extension)
-            else:
-                expected_meta = file_path.with_suffix(local_service.meta_extension)
-            
-            assert expected_meta.exists(), f"Metadata file not found for {filename}"
-
-    @pytest.mark.asyncio
     async def test_copy_file_copies_metadata(self, local_service):
         """Test that copying a file also copies its metadata."""
         # Create a file with metadata
-        upload_file = UploadFile(
-            filename="original.txt",
-            file=BytesIO(b"Original content")
-        )
+        upload_file = make_upload("original.txt", b"Original content")
         await local_service.write_file(upload_file)
         
         # Copy the file
@@ -744,24 +852,20 @@ class TestMetadataFiles:
         original_meta = local_service.base_path / ("original.txt" + local_service.meta_extension)
         copy_meta = local_service.base_path / ("copy.txt" + local_service.meta_extension)
         
-        assert original_meta.exists()
-        assert copy_meta.exists()
+        names = _names_in(local_service.base_path)
+        assert original_meta.name in names
+        assert copy_meta.name in names
         
         # Verify copy metadata has updated path
-        with open(copy_meta, "r") as f:
-            copy_metadata = json.load(f)
+        copy_metadata = _read_meta(copy_meta)
         
         assert copy_metadata["name"] == "copy.txt"  # Name is updated
         assert copy_metadata["path"] == "copy.txt"  # Path is updated
 
-    @pytest.mark.asyncio
     async def test_move_file_moves_metadata(self, local_service):
         """Test that moving a file also moves its metadata."""
         # Create a file with metadata
-        upload_file = UploadFile(
-            filename="source.txt",
-            file=BytesIO(b"Source content")
-        )
+        upload_file = make_upload("source.txt", b"Source content")
         await local_service.write_file(upload_file)
         
         # Verify metadata exists before move
@@ -772,24 +876,20 @@ class TestMetadataFiles:
         await local_service.move_file("source.txt", "destination.txt")
         
         # Verify old metadata is gone and new exists
-        assert not source_meta.exists()
         dest_meta = local_service.base_path / ("destination.txt" + local_service.meta_extension)
-        assert dest_meta.exists()
+        names = _names_in(local_service.base_path)
+        assert source_meta.name not in names
+        assert dest_meta.name in names
         
         # Verify metadata has updated path
-        with open(dest_meta, "r") as f:
-            dest_metadata = json.load(f)
+        dest_metadata = _read_meta(dest_meta)
         
         assert dest_metadata["path"] == "destination.txt"
 
-    @pytest.mark.asyncio
     async def test_delete_file_deletes_metadata(self, local_service):
         """Test that deleting a file also deletes its metadata."""
         # Create a file with metadata
-        upload_file = UploadFile(
-            filename="delete_test.txt",
-            file=BytesIO(b"Delete this")
-        )
+        upload_file = make_upload("delete_test.txt", b"Delete this")
         await local_service.write_file(upload_file)
         
         # Verify metadata exists
@@ -799,178 +899,153 @@ class TestMetadataFiles:
         # Delete the file
         await local_service.delete_file("delete_test.txt")
         
-        # Verify both file and metadata are gone
+        # Verify both file and metadata are gone (the emptied base folder may be removed too)
         file_path = local_service.base_path / "delete_test.txt"
         assert not file_path.exists()
         assert not meta_path.exists()
 
-    @pytest.mark.asyncio
-    async def test_metadata_contains_all_fields(self, local_service):
-        """Test that metadata JSON contains all FileNode fields."""
-        content = b"Complete metadata test"
-        upload_file = UploadFile(
-            filename="complete.json",
-            file=BytesIO(content)
-        )
-        
-        await local_service.write_file(upload_file, folder="complete")
-        
-        # Read metadata file
-        meta_path = local_service.base_path / "complete" / ("complete.json" + local_service.meta_extension)
-        with open(meta_path, "r") as f:
-            metadata = json.load(f)
-        
-        # Verify all required fields are present
-        assert "name" in metadata
-        assert "path" in metadata
-        assert "size" in metadata
-        assert "mime_type" in metadata
-        assert "is_file" in metadata
-        
-        # Verify values match the uploaded file
-        assert metadata["name"] == "complete.json"
-        assert metadata["path"] == "complete/complete.json"
-        assert metadata["size"] == len(content)
-        assert metadata["mime_type"] == "application/json"
-        assert metadata["is_file"] is True
-
-    @pytest.mark.asyncio
     async def test_read_metadata_from_json(self, local_service):
         """Test reading FileNode from metadata JSON file."""
         # Create a file with metadata
         content = b"Read metadata test"
-        upload_file = UploadFile(
-            filename="read_meta.txt",
-            file=BytesIO(content)
-        )
-        await local_service.write_file(upload_file)
+        upload_file = make_upload("read_meta.txt", content)
+        result = await local_service.write_file(upload_file)
+        assert result.size == len(content)
+        assert result.mime_type == "text/plain"
         
         # Read metadata using service method
         file_path = local_service.base_path / "read_meta.txt"
         file_node = local_service._read_file_node(file_path)
         
-        # Verify FileNode was reconstructed correctly
-        assert isinstance(file_node, FileNode)
-        assert file_node.name == "read_meta.txt"
-        assert file_node.path == "read_meta.txt"
-        assert file_node.size == len(content)
-        assert file_node.mime_type == "text/plain"
-        assert file_node.is_file is True
-
-    @pytest.mark.asyncio
-    async def test_metadata_with_subdirectories(self, local_service):
-        """Test that metadata files work correctly in subdirectories."""
-        content = b"Subdirectory test"
-        upload_file = UploadFile(
-            filename="subdir_file.txt",
-            file=BytesIO(content)
-        )
-        
-        await local_service.write_file(upload_file, folder="sub/dir/path")
-        
-        # Verify metadata file in subdirectory
-        file_path = local_service.base_path / "sub" / "dir" / "path" / "subdir_file.txt"
-        meta_path = file_path.with_suffix(file_path.suffix + local_service.meta_extension)
-        assert meta_path.exists()
+        # Verify FileNode was reconstructed as written
+        assert type(file_node) is FileNode
+        assert file_node == result
+
+    async def test_read_metadata_without_metadata_file(self, local_service):
+        """Test that a file without metadata file, or with an empty one, gets a node from its stats."""
+        file_path = local_service.base_path / "no_meta" / "data.csv"
+        file_path.parent.mkdir()
+        file_path.write_bytes(b"a,b\n1,2\n")
+        expected = {**FILE_META, "name": "data.csv", "path": "no_meta/data.csv", "size": 8, "mime_type": "text/csv"}
+        
+        assert local_service._read_file_node(file_path).model_dump() == expected
         
-        with open(meta_path, "r") as f:
-            metadata = json.load(f)
+        (file_path.parent / ("data.csv" + local_service.meta_extension)).write_bytes(b"")
+        assert local_service._read_file_node(file_path).model_dump() == expected
         
-        assert metadata["path"] == "sub/dir/path/subdir_file.txt"
+        # Files without metadata are listed too
+        assert [node.model_dump() for node in await local_service.list_files("no_meta")] == [expected]
+
+    async def test_read_metadata_is_parsed_once(self, local_service):
+        """Test that unchanged metadata files are not parsed again, but changed ones are."""
+        await local_service.write_file(make_upload("parsed_once.txt", b"content"))
+        file_path = local_service.base_path / "parsed_once.txt"
+        meta_path = local_service.base_path / ("parsed_once.txt" + local_service.meta_extension)
+        
+        with patch.object(FileNode, "model_validate_json", wraps=FileNode.model_validate_json) as parse:
+            # Node known from the write
+            first = local_service._read_file_node(file_path)
+            second = local_service._read_file_node(file_path)
+            assert parse.call_count == 0
+            assert first == second
+            assert first is not second
+            
+            # Metadata file changed by another process
+            metadata = _read_meta(meta_path)
+            metadata["size"] = 42
+            meta_path.write_bytes(json.dumps(metadata).encode())
+            os.utime(meta_path, ns=(0, 0))
+            
+            assert local_service._read_file_node(file_path).size == 42
+            assert local_service._read_file_node(file_path).size == 42
+            assert parse.call_count == 1
 
-    @pytest.mark.asyncio
     async def test_metadata_with_encryption(self, temp_dir, fernet_key):
         """Test that metadata files contain original (unencrypted) file size."""
         service = LocalFilesStore(base_path=temp_dir, key=fernet_key)
         
         original_content = b"Encrypted file content"
-        upload_file = UploadFile(
-            filename="encrypted.txt",
-            file=BytesIO(original_content)
-        )
+        upload_file = make_upload("encrypted.txt", original_content)
         
         await service.write_file(upload_file)
         
-        # Verify metadata exists
-        meta_path = service.base_path / ("encrypted.txt" + service.meta_extension)
-        assert meta_path.exists()
+        # Scan once for both the file and its metadata
+        with os.scandir(service.base_path) as scan:
+            entries = {entry.name: entry for entry in scan}
+        meta_name = "encrypted.txt" + service.meta_extension
+        assert meta_name in entries
         
         # Verify metadata contains original size (not encrypted size)
-        with open(meta_path, "r") as f:
-            metadata = json.load(f)
+        metadata = json.loads(Path(entries[meta_name].path).read_bytes())
         
         assert metadata["size"] == len(original_content)
         
         # Verify actual file on disk is larger (encrypted)
-        file_path = service.base_path / "encrypted.txt"
-        encrypted_size = file_path.stat().st_size
+        encrypted_size = entries["encrypted.txt"].stat().st_size
         assert encrypted_size > len(original_content)
 
-    @pytest.mark.asyncio
-    async def test_metadata_json_format_is_valid(self, local_service):
-        """Test that metadata JSON is valid and can be parsed."""
-        upload_file = UploadFile(
-            filename="valid_json.txt",
-            file=BytesIO(b"JSON validity test")
-        )
-        
-        await local_service.write_file(upload_file)
-        
-        meta_path = local_service.base_path / ("valid_json.txt" + local_service.meta_extension)
-        
-        # Attempt to parse JSON - should not raise exception
-        with open(meta_path, "r") as f:
-            metadata = json.load(f)
-        
-        # Should be a dictionary
-        assert isinstance(metadata, dict)
-
-    @pytest.mark.asyncio
-    async def test_copy_to_subfolder_updates_metadata_path(self, local_service):
-        """Test that copying file to subfolder correctly updates metadata path."""
+    async def test_copy_and_move_to_subfolder_update_metadata_path(self, local_service):
+        """Test that copying and moving a file to a subfolder correctly update the metadata path."""
         # Create source file
-        upload_file = UploadFile(
-            filename="source.txt",
-            file=BytesIO(b"Source")
-        )
+        upload_file = make_upload("source.txt", b"Source")
         await local_service.write_file(upload_file)
         
         # Copy to subfolder
         await local_service.copy_file("source.txt", "subfolder/destination.txt")
         
         # Verify destination metadata has correct path
-        dest_meta = local_service.base_path / "subfolder" / ("destination.txt" + local_service.meta_extension)
-        assert dest_meta.exists()
+        dest_meta = os.path.join(local_service.base_path, *SUBFOLDER_COPY_META)
+        assert os.path.exists(dest_meta)
         
-        with open(dest_meta, "r") as f:
-            metadata = json.load(f)
+        metadata = _read_meta(dest_meta)
         
         assert metadata["name"] == "destination.txt"
         assert metadata["path"] == "subfolder/destination.txt"
-
-    @pytest.mark.asyncio
-    async def test_move_to_subfolder_updates_metadata_path(self, local_service):
-        """Test that moving file to subfolder correctly updates metadata path."""
-        # Create source file
-        upload_file = UploadFile(
-            filename="move_source.txt",
-            file=BytesIO(b"Move me")
-        )
-        await local_service.write_file(upload_file)
         
         # Move to subfolder
-        await local_service.move_file("move_source.txt", "subfolder/moved.txt")
+        await local_service.move_file("source.txt", "subfolder/moved.txt")
         
         # Verify old metadata is gone
-        old_meta = local_service.base_path / ("move_source.txt" + local_service.meta_extension)
-        assert not old_meta.exists()
+        assert "source.txt" + local_service.meta_extension not in _names_in(local_service.base_path)
         
-        # Verify new metadata has correct path
-        new_meta = local_service.base_path / "subfolder" / ("moved.txt" + local_service.meta_extension)
-        assert new_meta.exists()
+        # Verify new metadata has correct path, next to the copy
+        new_dir = os.path.join(local_service.base_path, *SUBFOLDER_MOVE_META[:-1])
+        assert {SUBFOLDER_COPY_META[-1], SUBFOLDER_MOVE_META[-1]} <= _names_in(new_dir)
+        new_meta = os.path.join(new_dir, SUBFOLDER_MOVE_META[-1])
         
-        with open(new_meta, "r") as f:
-            metadata = json.load(f)
+        metadata = _read_meta(new_meta)
         
         assert metadata["name"] == "moved.txt"
         assert metadata["path"] == "subfolder/moved.txt"
+
+    async def test_durable_write_creates_metadata(self, temp_dir):
+        """Test that a durable store writes the same file and metadata."""
+        service = LocalFilesStore(base_path=temp_dir, durable=True)
+        content = b"Durable content"
+        upload_file = make_upload("durable.txt", content)
+        
+        result = await service.write_file(upload_file, folder="durable")
+        assert result.size == len(content)
+        assert result.path == "durable/durable.txt"
+        
+        file_path = service.base_path / "durable" / "durable.txt"
+        assert file_path.read_bytes() == content
+        
+        meta_path = file_path.with_suffix(file_path.suffix + service.meta_extension)
+        assert _read_meta(meta_path) == result.model_dump()
+
+    async def test_copy_after_delete_does_not_reuse_metadata(self, local_service):
+        """Test that cached metadata of a deleted file is not reused."""
+        await local_service.write_file(make_upload("cached.txt", b"first"), folder="cache")
+        assert await local_service.delete_file("cache/cached.txt")
+        
+        # Same path, different file
+        source_path = local_service.base_path / "cache" / "cached.txt"
+        source_path.parent.mkdir(parents=True, exist_ok=True)
+        source_path.write_bytes(b"second content")
+        
+        assert await local_service.copy_file("cache/cached.txt", "cache/copy.txt")
+        copy_path = local_service.base_path / "cache" / "copy.txt"
+        meta_path = copy_path.with_suffix(copy_path.suffix + local_service.meta_extension)
+        assert copy_path.read_bytes() == b"second content"
+        assert _read_meta(meta_path)["size"] == len(b"second content")
@@ -1,11 +1,15 @@
+import json
 import pytest
+from uuid import uuid4
 from io import BytesIO
+from contextlib import ExitStack
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 from cryptography.fernet import Fernet
 from fastapi.datastructures import UploadFile
 from starlette.datastructures import Headers
 from enacit4r_files.services import S3FilesStore
-from enacit4r_files.services.s3 import S3Service
+from enacit4r_files.services.s3 import S3Service, FILE_NODE_METADATA
 from enacit4r_files.models.files import FileNode, FileRef
 
 
@@ -21,7 +25,9 @@ def mock_s3_service():
     # Mock methods
     service.path_exists = AsyncMock(return_value=False)
     service.list_files = AsyncMock(return_value=[])
+    service.list_files_parallel = AsyncMock(return_value=[])
     service.get_file = AsyncMock(return_value=(False, False))
+    service.head_file = AsyncMock(return_value=False)
     service.upload_file = AsyncMock()
     service.upload_local_file = AsyncMock()
     service.copy_file = AsyncMock(return_value=False)
@@ -39,11 +45,44 @@ def s3_files_store(mock_s3_service):
 
 
 @pytest.fixture
+def spy(s3_files_store):
+    """Patch the metadata helpers of the S3FilesStore fixture with async mocks."""
+    with ExitStack() as stack:
+        yield SimpleNamespace(
+            head=stack.enter_context(patch.object(s3_files_store, '_head_file_node', new_callable=AsyncMock, return_value=(None, False))),
+            dump=stack.enter_context(patch.object(s3_files_store, '_dump_file_node', new_callable=AsyncMock)),
+            delete=stack.enter_context(patch.object(s3_files_store, '_delete_file_node', new_callable=AsyncMock)),
+        )
+
+
+@pytest.fixture(scope="module")
+def one_mb_content():
+    """A 1 MB zero-filled content, allocated once for the module."""
+    return bytes(1024 * 1024)
+
+
+@pytest.fixture(scope="session")
 def fernet_key():
-    """Generate a Fernet key for encryption tests."""
+    """Generate a Fernet key for encryption tests, once per session."""
     return Fernet.generate_key()
 
 
+@pytest.fixture(scope="session")
+def fernet(fernet_key):
+    """Create a Fernet cipher with the test key, to encrypt or decrypt content manually."""
+    return Fernet(fernet_key)
+
+
+# filename, content, content type, folder and whether the store encrypts
+WRITE_CASES = [
+    ("test.txt", b"Test file content", "text/plain", "uploads", False),
+    ("root.txt", b"Root file content", "text/plain", "", False),
+    ("encrypted.txt", b"Secret file content", "text/plain", "secure", True),
+    ("binary.bin", bytes(range(256)), "application/octet-stream", "", True),
+    ("special.txt", "Hello 世界! 🌍 Special: @#$%^&*()".encode('utf-8'), "text/plain", "", True),
+]
+
+
 class TestS3FilesStore:
     """Test suite for S3FilesStore."""
 
@@ -61,62 +100,54 @@ class TestS3FilesStore:
         assert service.fernet is not None
 
     @pytest.mark.asyncio
-    async def test_write_file(self, s3_files_store, mock_s3_service):
-        """Test writing a file via UploadFile."""
-        content = b"Test file content"
-        headers = Headers({'content-type': 'text/plain'})
+    @pytest.mark.parametrize("filename,content,content_type,folder,encrypted", WRITE_CASES)
+    async def test_write_file(self, mock_s3_service, fernet_key, fernet, filename, content, content_type, folder, encrypted):
+        """Test writing a file via UploadFile with a single upload, and reading it back."""
+        service = S3FilesStore(s3_service=mock_s3_service, key=fernet_key if encrypted else None)
         upload_file = UploadFile(
-            filename="test.txt",
+            filename=filename,
             file=BytesIO(content),
-            headers=headers
+            headers=Headers({'content-type': content_type})
         )
-        
-        # Mock S3Service upload_file to return a FileRef
-        mock_file_ref = FileRef(
-            name="test.txt",
-            path="uploads/test.txt",
+        path = f"{folder}/{filename}" if folder else filename
+        mock_s3_service.upload_file.return_value = FileRef(
+            name=filename,
+            path=path,
             size=len(content),
-            mime_type="text/plain"
+            mime_type=content_type
         )
-        mock_s3_service.upload_file.return_value = mock_file_ref
-        mock_s3_service.upload_local_file.return_value = mock_file_ref
         
-        result = await s3_files_store.write_file(upload_file, folder="uploads")
+        result = await service.write_file(upload_file, folder=folder)
         
         assert isinstance(result, FileNode)
-        assert result.name == "test.txt"
-        assert result.path == "uploads/test.txt"
-        assert result.size == len(content)
+        assert result.name == filename
+        assert result.path == path
+        assert result.size == len(content)  # Original size, not encrypted size
         assert result.is_file is True
-        assert result.mime_type == "text/plain"
+        assert result.mime_type == content_type
         
-        # Verify S3Service methods were called
-        assert mock_s3_service.upload_file.called
-        assert mock_s3_service.upload_local_file.called  # For metadata
-
-    @pytest.mark.asyncio
-    async def test_upload_file_to_root(self, s3_files_store, mock_s3_service):
-        """Test writing a file to the root folder."""
-        content = b"Root file content"
-        upload_file = UploadFile(
-            filename="root.txt",
-            file=BytesIO(content)
-        )
+        # Verify metadata was uploaded along with the file
+        assert mock_s3_service.upload_file.call_count == 1
+        metadata = mock_s3_service.upload_file.call_args.kwargs["metadata"]
+        assert json.loads(metadata[FILE_NODE_METADATA]) == {"size": len(content), "is_file": True}
+        assert not mock_s3_service.upload_local_file.called
         
-        mock_file_ref = FileRef(
-            name="root.txt",
-            path="root.txt",
-            size=len(content),
-            mime_type="text/plain"
-        )
-        mock_s3_service.upload_file.return_value = mock_file_ref
-        mock_s3_service.upload_local_file.return_value = mock_file_ref
-        
-        result = await s3_files_store.write_file(upload_file)
+        uploaded_file = mock_s3_service.upload_file.call_args[0][0]
+        uploaded_content = uploaded_file.file.read()
+        if encrypted:
+            # Encrypted content should be different from original
+            assert uploaded_content != content
+            assert fernet.decrypt(uploaded_content) == content
+        else:
+            # Should be the same as original, streamed from the uploaded file
+            assert uploaded_content == content
+            assert uploaded_file.file is upload_file.file
         
-        assert result.name == "root.txt"
-        assert result.path == "root.txt"
-        assert result.is_file is True
+        # Retrieve and verify
+        mock_s3_service.get_file.return_value = (uploaded_content, content_type)
+        retrieved_content, mime_type = await service.get_file(path)
+        assert retrieved_content == content
+        assert mime_type == content_type
 
     @pytest.mark.asyncio
     async def test_write_local_file(self, s3_files_store, mock_s3_service, tmp_path):
@@ -142,6 +173,46 @@ class TestS3FilesStore:
         assert result.size == len(test_content)
         assert result.is_file is True
 
+    @pytest.mark.asyncio
+    async def test_write_local_file_from_s3_mount(self, mock_s3_service, tmp_path):
+        """Test that a local file from the mounted S3 prefix is copied server-side."""
+        service = S3FilesStore(s3_service=mock_s3_service, mount_path=str(tmp_path))
+        test_file = tmp_path / "inbox" / "sample.txt"
+        test_file.parent.mkdir()
+        test_content = b"Mounted content"
+        test_file.write_bytes(test_content)
+        mock_s3_service.copy_file.return_value = "test-prefix/docs/sample.txt"
+        
+        result = await service.write_local_file(str(test_file), folder="docs")
+        
+        assert result.name == "sample.txt"
+        assert result.path == "docs/sample.txt"
+        assert result.size == len(test_content)
+        assert result.mime_type == "text/plain"
+        assert not mock_s3_service.upload_local_file.called
+        mock_s3_service.copy_file.assert_called_once_with(
+            "inbox/sample.txt", "docs/sample.txt",
+            metadata={FILE_NODE_METADATA: f'{{"size":{len(test_content)},"is_file":true}}'},
+            mime_type="text/plain")
+
+    @pytest.mark.asyncio
+    async def test_write_local_file_outside_s3_mount(self, mock_s3_service, tmp_path):
+        """Test that a local file outside the mounted S3 prefix is uploaded."""
+        service = S3FilesStore(s3_service=mock_s3_service, mount_path=str(tmp_path / "mount"))
+        test_file = tmp_path / "sample.txt"
+        test_file.write_bytes(b"Local content")
+        mock_s3_service.upload_local_file.return_value = FileRef(
+            name="sample.txt",
+            path="docs/sample.txt",
+            size=13,
+            mime_type="text/plain"
+        )
+        
+        await service.write_local_file(str(test_file), folder="docs")
+        
+        assert mock_s3_service.upload_local_file.called
+        assert not mock_s3_service.copy_file.called
+
     @pytest.mark.asyncio
     async def test_upload_local_file_not_found(self, s3_files_store):
         """Test writing a non-existent local file."""
@@ -192,7 +263,7 @@ class TestS3FilesStore:
         mock_s3_service.to_s3_key.return_value = ""
         
         # Mock metadata reading
-        async def mock_read_metadata(key):
+        async def mock_read_metadata(key, json_file=None):
             if "file1.txt" in key and not key.endswith(s3_files_store.meta_extension):
                 return FileNode(name="file1.txt", path="file1.txt", size=100, mime_type="text/plain", is_file=True)
             elif "file2.txt" in key and not key.endswith(s3_files_store.meta_extension):
@@ -232,7 +303,7 @@ class TestS3FilesStore:
         mock_s3_service.list_files.return_value = mock_keys
         mock_s3_service.to_s3_key.return_value = ""
         
-        async def mock_read_metadata(key):
+        async def mock_read_metadata(key, json_file=None):
             if "file1.txt" in key and not key.endswith(s3_files_store.meta_extension):
                 return FileNode(name="file1.txt", path="file1.txt", size=100, mime_type="text/plain", is_file=True)
             elif "file2.txt" in key and not key.endswith(s3_files_store.meta_extension):
@@ -294,6 +365,22 @@ class TestS3FilesStore:
         assert again.children[0].is_file
         assert again.children[0].name == "file4.txt"
 
+    @pytest.mark.asyncio
+    async def test_list_files_parallel(self, s3_files_store, mock_s3_service):
+        """Test that a parallel listing uses the sharded S3 listing."""
+        mock_s3_service.list_files_parallel.return_value = ["file1.txt"]
+        mock_s3_service.to_s3_key.return_value = ""
+        
+        async def mock_read_metadata(key, json_file=None):
+            return FileNode(name=key, path=key, size=100, mime_type="text/plain", is_file=True)
+        
+        with patch.object(s3_files_store, '_read_file_node', side_effect=mock_read_metadata):
+            result = await s3_files_store.list_files("", recursive=True, parallel=True)
+        
+        assert [node.name for node in result] == ["file1.txt"]
+        mock_s3_service.list_files_parallel.assert_called_once_with("")
+        assert not mock_s3_service.list_files.called
+
     @pytest.mark.asyncio
     async def test_list_files_in_subfolder(self, s3_files_store, mock_s3_service):
         """Test listing files in a subfolder."""
@@ -306,7 +393,7 @@ class TestS3FilesStore:
         mock_s3_service.list_files.return_value = mock_keys
         mock_s3_service.to_s3_key.return_value = "subdir/"
         
-        async def mock_read_metadata(key):
+        async def mock_read_metadata(key, json_file=None):
             if "file1.txt" in key and not key.endswith(s3_files_store.meta_extension):
                 return FileNode(name="file1.txt", path="subdir/file1.txt", size=100, mime_type="text/plain", is_file=True)
             elif "file2.txt" in key and not key.endswith(s3_files_store.meta_extension):
@@ -321,6 +408,71 @@ class TestS3FilesStore:
         file_names = {node.name for node in result}
         assert file_names == {"file1.txt", "file2.txt"}
 
+    @pytest.mark.asyncio
+    async def test_list_files_reads_metadata_once(self, s3_files_store, mock_s3_service):
+        """Test that listed files are read with a single request each."""
+        mock_keys = [
+            "legacy.txt",
+            f"legacy.txt{s3_files_store.meta_extension}",
+            "file.txt",
+            "image.png",
+        ]
+        mock_s3_service.list_files.return_value = mock_keys
+        mock_s3_service.to_s3_key.return_value = ""
+        
+        legacy_node = FileNode(name="legacy.txt", path="legacy.txt", size=10, mime_type="text/plain", is_file=True)
+        mock_s3_service.get_file.return_value = (legacy_node.model_dump_json().encode("utf-8"), "application/json")
+        
+        async def mock_head_file(key):
+            if key == "file.txt":
+                return {"ContentType": "text/plain", "Metadata": {FILE_NODE_METADATA: '{"size":20,"is_file":true}'}}
+            # Original of a converted image, without metadata
+            return {"ContentType": "image/png", "Metadata": {}}
+        mock_s3_service.head_file.side_effect = mock_head_file
+        
+        result = await s3_files_store.list_files("")
+        
+        assert [(node.name, node.size) for node in result] == [("legacy.txt", 10), ("file.txt", 20)]
+        mock_s3_service.get_file.assert_called_once_with(f"legacy.txt{s3_files_store.meta_extension}")
+        assert [c.args[0] for c in mock_s3_service.head_file.call_args_list] == ["file.txt", "image.png"]
+
+    @pytest.mark.asyncio
+    async def test_list_files_skips_folder_markers(self, s3_files_store, mock_s3_service):
+        """Test that folder markers and metadata files are not read as files."""
+        mock_keys = [
+            "subdir/",
+            f"subdir/file1.txt{s3_files_store.meta_extension}",
+            "/orphan.txt",
+        ]
+        mock_s3_service.list_files.return_value = mock_keys
+        mock_s3_service.to_s3_key.side_effect = None
+        mock_s3_service.to_s3_key.return_value = ""
+        
+        with patch.object(s3_files_store, '_read_file_node', new_callable=AsyncMock) as mock_read:
+            result = await s3_files_store.list_files("")
+            assert [(node.name, node.is_file) for node in result] == [("subdir", False)]
+            
+            result = await s3_files_store.list_files("", recursive=True)
+            assert result == []
+            assert not mock_read.called
+
+    @pytest.mark.asyncio
+    async def test_list_files_skips_unreadable_metadata(self, s3_files_store, mock_s3_service):
+        """Test that listing keeps the files whose metadata could be read, in order."""
+        mock_keys = ["a.txt", "b.txt", "c.txt"]
+        mock_s3_service.list_files.return_value = mock_keys
+        mock_s3_service.to_s3_key.return_value = ""
+        
+        async def mock_read_metadata(key, json_file=None):
+            if key == "b.txt":
+                raise ValueError("Invalid metadata")
+            return FileNode(name=key, path=key, size=1, is_file=True)
+        
+        with patch.object(s3_files_store, '_read_file_node', side_effect=mock_read_metadata):
+            result = await s3_files_store.list_files("")
+        
+        assert [node.name for node in result] == ["a.txt", "c.txt"]
+
     @pytest.mark.asyncio
     async def test_file_exists_file(self, s3_files_store, mock_s3_service):
         """Test checking if a file exists."""
@@ -332,16 +484,39 @@ class TestS3FilesStore:
         assert await s3_files_store.file_exists("notexists.txt") is False
 
     @pytest.mark.asyncio
-    async def test_copy_file(self, s3_files_store, mock_s3_service):
+    async def test_file_exists_cached(self, mock_s3_service):
+        """Test that a file whose metadata is cached exists without a request to S3."""
+        service = S3FilesStore(s3_service=mock_s3_service, metadata_cache_enabled=True)
+        mock_s3_service.head_file.return_value = {
+            "ContentType": "text/plain",
+            "Metadata": {FILE_NODE_METADATA: '{"size":100,"is_file":true}'}
+        }
+        mock_s3_service.path_exists.return_value = False
+        
+        # Uncached files are checked in S3
+        assert await service.file_exists("exists.txt") is False
+        assert mock_s3_service.path_exists.call_count == 1
+        
+        # Cached files are not
+        await service._read_file_node("exists.txt")
+        assert await service.file_exists("exists.txt") is True
+        assert mock_s3_service.path_exists.call_count == 1
+        
+        # Deleted files are checked in S3 again
+        mock_s3_service.delete_file.return_value = "exists.txt"
+        await service.delete_file("exists.txt")
+        assert await service.file_exists("exists.txt") is False
+        assert mock_s3_service.path_exists.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_copy_file(self, s3_files_store, mock_s3_service, spy):
         """Test copying a file."""
         mock_s3_service.copy_file.return_value = "destination.txt"
+        spy.head.return_value = (FileNode(name="source.txt", path="source.txt", size=100, mime_type="text/plain", is_file=True), False)
         
-        # Mock metadata reading and writing
-        mock_node = FileNode(name="source.txt", path="source.txt", size=100, mime_type="text/plain", is_file=True)
-        with patch.object(s3_files_store, '_read_file_node', return_value=mock_node):
-            with patch.object(s3_files_store, '_dump_file_node', new_callable=AsyncMock):
-                result = await s3_files_store.copy_file("source.txt", "destination.txt")
+        result = await s3_files_store.copy_file("source.txt", "destination.txt")
         
+        assert not spy.dump.called
         assert result is True
         mock_s3_service.copy_file.assert_called_once_with("source.txt", "destination.txt")
 
@@ -354,17 +529,15 @@ class TestS3FilesStore:
         assert result is False
 
     @pytest.mark.asyncio
-    async def test_move_file(self, s3_files_store, mock_s3_service):
+    async def test_move_file(self, s3_files_store, mock_s3_service, spy):
         """Test moving a file."""
         mock_s3_service.move_file.return_value = "destination.txt"
+        spy.head.return_value = (FileNode(name="source.txt", path="source.txt", size=100, mime_type="text/plain", is_file=True), False)
         
-        # Mock metadata operations
-        mock_node = FileNode(name="source.txt", path="source.txt", size=100, mime_type="text/plain", is_file=True)
-        with patch.object(s3_files_store, '_read_file_node', return_value=mock_node):
-            with patch.object(s3_files_store, '_dump_file_node', new_callable=AsyncMock):
-                with patch.object(s3_files_store, '_delete_file_node', new_callable=AsyncMock):
-                    result = await s3_files_store.move_file("source.txt", "destination.txt")
+        result = await s3_files_store.move_file("source.txt", "destination.txt")
         
+        assert not spy.dump.called
+        assert not spy.delete.called
         assert result is True
         mock_s3_service.move_file.assert_called_once_with("source.txt", "destination.txt")
 
@@ -377,78 +550,36 @@ class TestS3FilesStore:
         assert result is False
 
     @pytest.mark.asyncio
-    async def test_delete_file(self, s3_files_store, mock_s3_service):
+    async def test_delete_file(self, s3_files_store, mock_s3_service, spy):
         """Test deleting a file."""
         mock_s3_service.delete_file.return_value = "delete_me.txt"
-        mock_none = FileNode(name="delete_me.txt", path="delete_me.txt", size=100, mime_type="text/plain", is_file=True)
-        with patch.object(s3_files_store, '_read_file_node', return_value=mock_none): 
-            with patch.object(s3_files_store, '_delete_file_node', new_callable=AsyncMock):
-                result = await s3_files_store.delete_file("delete_me.txt")
+        spy.head.return_value = (FileNode(name="delete_me.txt", path="delete_me.txt", size=100, mime_type="text/plain", is_file=True), False)
+        
+        result = await s3_files_store.delete_file("delete_me.txt")
         
+        assert not spy.delete.called
         assert result is True
         mock_s3_service.delete_file.assert_called_once_with("delete_me.txt")
 
     @pytest.mark.asyncio
-    async def test_delete_file_not_found(self, s3_files_store, mock_s3_service):
+    async def test_delete_file_not_found(self, s3_files_store, mock_s3_service, spy):
         """Test deleting a non-existent file."""
         mock_s3_service.delete_file.return_value = False
         
-        with patch.object(s3_files_store, '_read_file_node', return_value=None):
-            result = await s3_files_store.delete_file("nonexistent.txt")
-            assert result is True  # Deleting non-existent file is a no-op
+        result = await s3_files_store.delete_file("nonexistent.txt")
+        assert result is True  # Deleting non-existent file is a no-op
 
 
 class TestS3FilesStoreWithEncryption:
     """Test suite for S3FilesStore with Fernet encryption."""
 
     @pytest.mark.asyncio
-    async def test_upload_file_with_encryption(self, mock_s3_service, fernet_key):
-        """Test writing a file with encryption enabled."""
-        service = S3FilesStore(s3_service=mock_s3_service, key=fernet_key)
-        
-        content = b"Secret file content"
-        upload_file = UploadFile(
-            filename="encrypted.txt",
-            file=BytesIO(content)
-        )
-        
-        mock_file_ref = FileRef(
-            name="encrypted.txt",
-            path="secure/encrypted.txt",
-            size=len(content),
-            mime_type="text/plain"
-        )
-        mock_s3_service.upload_file.return_value = mock_file_ref
-        mock_s3_service.upload_local_file.return_value = mock_file_ref
-        
-        result = await service.write_file(upload_file, folder="secure")
-        
-        assert isinstance(result, FileNode)
-        assert result.name == "encrypted.txt"
-        assert result.is_file is True
-        assert result.size == len(content)  # Original size, not encrypted size
-        
-        # Verify that the content sent to S3 was encrypted
-        call_args = mock_s3_service.upload_file.call_args
-        uploaded_file = call_args[0][0]
-        uploaded_content = uploaded_file.file.read()
-        
-        # Encrypted content should be different from original
-        assert uploaded_content != content
-        
-        # Decrypt to verify
-        fernet = Fernet(fernet_key)
-        decrypted = fernet.decrypt(uploaded_content)
-        assert decrypted == content
-
-    @pytest.mark.asyncio
-    async def test_get_file_with_encryption(self, mock_s3_service, fernet_key):
+    async def test_get_file_with_encryption(self, mock_s3_service, fernet_key, fernet):
         """Test retrieving an encrypted file."""
         service = S3FilesStore(s3_service=mock_s3_service, key=fernet_key)
         
         # Encrypt content
         original_content = b"Secret content"
-        fernet = Fernet(fernet_key)
         encrypted_content = fernet.encrypt(original_content)
         
         mock_s3_service.get_file.return_value = (encrypted_content, "text/plain")
@@ -460,7 +591,7 @@ class TestS3FilesStoreWithEncryption:
         assert mime_type == "text/plain"
 
     @pytest.mark.asyncio
-    async def test_upload_local_file_with_encryption(self, mock_s3_service, fernet_key, tmp_path):
+    async def test_upload_local_file_with_encryption(self, mock_s3_service, fernet_key, fernet, tmp_path):
         """Test writing a local file with encryption."""
         service = S3FilesStore(s3_service=mock_s3_service, key=fernet_key)
         
@@ -475,13 +606,20 @@ class TestS3FilesStoreWithEncryption:
             size=len(original_content),
             mime_type="text/plain"
         )
-        mock_s3_service.upload_local_file.return_value = mock_file_ref
+        mock_s3_service.upload_file.return_value = mock_file_ref
         
         result = await service.write_local_file(str(source_path), folder="encrypted")
         
         assert result.name == "source.txt"
         assert result.is_file is True
         assert result.size == len(original_content)
+        
+        # Verify that the encrypted content was uploaded from memory
+        assert not mock_s3_service.upload_local_file.called
+        uploaded_file = mock_s3_service.upload_file.call_args[0][0]
+        assert uploaded_file.filename == "source.txt"
+        assert uploaded_file.content_type == "text/plain"
+        assert fernet.decrypt(uploaded_file.file.read()) == original_content
 
     @pytest.mark.asyncio
     async def test_round_trip_with_encryption(self, mock_s3_service, fernet_key):
@@ -522,27 +660,32 @@ class TestS3FilesStoreWithEncryption:
         assert mime_type == "text/plain"
 
     @pytest.mark.asyncio
-    async def test_encryption_with_binary_file(self, mock_s3_service, fernet_key):
-        """Test encryption with binary file content."""
+    async def test_encryption_with_large_content(self, mock_s3_service, fernet_key, tmp_path, one_mb_content):
+        """Test encryption with larger file content, read from a file like a spooled upload."""
         service = S3FilesStore(s3_service=mock_s3_service, key=fernet_key)
         
-        # Create binary content
-        binary_content = bytes(range(256))
+        large_content = one_mb_content
+        source_path = tmp_path / "large.txt"
+        source_path.write_bytes(large_content)
+        source_file = open(source_path, "rb")
         upload_file = UploadFile(
-            filename="binary.bin",
-            file=BytesIO(binary_content)
+            filename="large.txt",
+            file=source_file
         )
         
         mock_file_ref = FileRef(
-            name="binary.bin",
-            path="binary.bin",
-            size=len(binary_content),
-            mime_type="application/octet-stream"
+            name="large.txt",
+            path="large.txt",
+            size=len(large_content),
+            mime_type="text/plain"
         )
         mock_s3_service.upload_file.return_value = mock_file_ref
         mock_s3_service.upload_local_file.return_value = mock_file_ref
         
-        await service.write_file(upload_file)
+        try:
+            await service.write_file(upload_file)
+        finally:
+            source_file.close()
         
         # Get encrypted content
         call_args = mock_s3_service.upload_file.call_args
@@ -550,47 +693,41 @@ class TestS3FilesStoreWithEncryption:
         encrypted_content = uploaded_file.file.read()
         
         # Mock retrieval
-        mock_s3_service.get_file.return_value = (encrypted_content, "application/octet-stream")
+        mock_s3_service.get_file.return_value = (encrypted_content, "text/plain")
         
         # Retrieve and verify
-        retrieved_content, _ = await service.get_file("binary.bin")
-        assert retrieved_content == binary_content
+        retrieved_content, _ = await service.get_file("large.txt")
+        assert retrieved_content == large_content
+        assert len(retrieved_content) == len(large_content)
 
     @pytest.mark.asyncio
-    async def test_encryption_with_large_content(self, mock_s3_service, fernet_key):
-        """Test encryption with larger file content."""
-        service = S3FilesStore(s3_service=mock_s3_service, key=fernet_key)
+    async def test_round_trip_with_aesgcm_encryption(self, mock_s3_service, fernet_key):
+        """Test that content encrypted in chunks with AES-GCM is decrypted on retrieval."""
+        service = S3FilesStore(s3_service=mock_s3_service, key=fernet_key, use_aesgcm=True)
         
-        # Create a larger content (1MB)
-        large_content = b"X" * (1024 * 1024)
+        # Not a multiple of the encryption chunk size
+        original_content = bytes(range(256)) * 4097
         upload_file = UploadFile(
-            filename="large.txt",
-            file=BytesIO(large_content)
+            filename="large.bin",
+            file=BytesIO(original_content)
         )
-        
-        mock_file_ref = FileRef(
-            name="large.txt",
-            path="large.txt",
-            size=len(large_content),
-            mime_type="text/plain"
+        mock_s3_service.upload_file.return_value = FileRef(
+            name="large.bin",
+            path="large.bin",
+            size=len(original_content),
+            mime_type="application/octet-stream"
         )
-        mock_s3_service.upload_file.return_value = mock_file_ref
-        mock_s3_service.upload_local_file.return_value = mock_file_ref
         
-        await service.write_file(upload_file)
+        result = await service.write_file(upload_file)
+        assert result.size == len(original_content)
         
-        # Get encrypted content
-        call_args = mock_s3_service.upload_file.call_args
-        uploaded_file = call_args[0][0]
+        uploaded_file = mock_s3_service.upload_file.call_args[0][0]
         encrypted_content = uploaded_file.file.read()
+        assert service.decrypt_content(encrypted_content) == original_content
         
-        # Mock retrieval
-        mock_s3_service.get_file.return_value = (encrypted_content, "text/plain")
-        
-        # Retrieve and verify
-        retrieved_content, _ = await service.get_file("large.txt")
-        assert retrieved_content == large_content
-        assert len(retrieved_content) == len(large_content)
+        mock_s3_service.get_file.return_value = (encrypted_content, "application/octet-stream")
+        retrieved_content, _ = await service.get_file("large.bin")
+        assert retrieved_content == original_content
 
     @pytest.mark.asyncio
     async def test_encryption_methods_directly(self, mock_s3_service, fernet_key):
@@ -609,69 +746,29 @@ class TestS3FilesStoreWithEncryption:
         assert decrypted == original_content
 
     @pytest.mark.asyncio
-    async def test_no_encryption_when_key_not_provided(self, mock_s3_service):
-        """Test that files are not encrypted when no key is provided."""
-        service = S3FilesStore(s3_service=mock_s3_service, key=None)
-        
-        original_content = b"Unencrypted content"
-        upload_file = UploadFile(
-            filename="plain.txt",
-            file=BytesIO(original_content)
-        )
-        
-        mock_file_ref = FileRef(
-            name="plain.txt",
-            path="plain.txt",
-            size=len(original_content),
-            mime_type="text/plain"
-        )
-        mock_s3_service.upload_file.return_value = mock_file_ref
-        mock_s3_service.upload_local_file.return_value = mock_file_ref
+    async def test_encryption_with_shared_fernet(self, mock_s3_service, fernet):
+        """Test that a Fernet cipher can be shared between stores instead of a key."""
+        service = S3FilesStore(s3_service=mock_s3_service, key=fernet)
+        other_service = S3FilesStore(s3_service=mock_s3_service, key=fernet)
         
-        await service.write_file(upload_file)
+        assert service.is_encrypted
+        assert service.fernet is fernet
+        assert other_service.decrypt_content(service.encrypt_content(b"Shared cipher")) == b"Shared cipher"
         
-        # Verify content was not encrypted
-        call_args = mock_s3_service.upload_file.call_args
-        uploaded_file = call_args[0][0]
-        uploaded_content = uploaded_file.file.read()
-        
-        # Should be the same as original
-        assert uploaded_content == original_content
+        with pytest.raises(ValueError):
+            S3FilesStore(s3_service=mock_s3_service, key=fernet, use_aesgcm=True)
 
-    @pytest.mark.asyncio
-    async def test_encryption_with_special_characters(self, mock_s3_service, fernet_key):
-        """Test encryption with special characters and unicode."""
-        service = S3FilesStore(s3_service=mock_s3_service, key=fernet_key)
-        
-        # Content with special characters
-        special_content = "Hello 世界! 🌍 Special: @#$%^&*()".encode('utf-8')
-        upload_file = UploadFile(
-            filename="special.txt",
-            file=BytesIO(special_content)
-        )
-        
-        mock_file_ref = FileRef(
-            name="special.txt",
-            path="special.txt",
-            size=len(special_content),
-            mime_type="text/plain"
-        )
-        mock_s3_service.upload_file.return_value = mock_file_ref
-        mock_s3_service.upload_local_file.return_value = mock_file_ref
+    @pytest.mark.parametrize("use_aesgcm", [False, True])
+    def test_encryption_methods_direct_many_small(self, mock_s3_service, fernet_key, use_aesgcm):
+        """Test that many small contents are encrypted and decrypted with the same cipher."""
+        service = S3FilesStore(s3_service=mock_s3_service, key=fernet_key, use_aesgcm=use_aesgcm)
+        cipher = service.aesgcm if use_aesgcm else service.fernet
         
-        await service.write_file(upload_file)
+        for i in range(5):
+            content = f"small content {i}".encode()
+            assert service.decrypt_content(service.encrypt_content(content)) == content
         
-        # Get encrypted content
-        call_args = mock_s3_service.upload_file.call_args
-        uploaded_file = call_args[0][0]
-        encrypted_content = uploaded_file.file.read()
-        
-        # Mock retrieval
-        mock_s3_service.get_file.return_value = (encrypted_content, "text/plain")
-        
-        # Retrieve and verify
-        retrieved_content, _ = await service.get_file("special.txt")
-        assert retrieved_content == special_content
+        assert (service.aesgcm if use_aesgcm else service.fernet) is cipher
 
 
 class TestS3MetadataOperations:
@@ -688,7 +785,7 @@ class TestS3MetadataOperations:
             is_file=True
         )
         
-        mock_s3_service.upload_local_file.return_value = FileRef(
+        mock_s3_service.upload_file.return_value = FileRef(
             name=f"test.txt{s3_files_store.meta_extension}",
             path=f"folder/test.txt{s3_files_store.meta_extension}",
             size=200,
@@ -697,12 +794,75 @@ class TestS3MetadataOperations:
         
         await s3_files_store._dump_file_node(node, "folder")
         
-        # Verify upload was called
-        assert mock_s3_service.upload_local_file.called
+        # Verify the serialized node was uploaded
+        json_file, s3_folder = mock_s3_service.upload_file.call_args[0]
+        assert json_file.filename == f"test.txt{s3_files_store.meta_extension}"
+        assert json_file.content_type == "application/json"
+        assert s3_folder == "folder"
+        assert FileNode.model_validate_json(json_file.file.read()) == node
+        assert not mock_s3_service.upload_local_file.called
 
     @pytest.mark.asyncio
     async def test_read_file_node(self, s3_files_store, mock_s3_service):
-        """Test reading FileNode metadata from S3."""
+        """Test reading FileNode metadata from the S3 object metadata."""
+        mock_s3_service.head_file.return_value = {
+            "ContentType": "text/plain",
+            "ContentLength": 140,
+            "Metadata": {FILE_NODE_METADATA: '{"size":100,"is_file":true}'}
+        }
+        
+        result = await s3_files_store._read_file_node("test-prefix/folder/my file.txt")
+        
+        assert result is not None
+        assert result.name == "my file.txt"
+        assert result.path == "folder/my%20file.txt"
+        assert result.size == 100
+        assert result.mime_type == "text/plain"
+        assert result.is_file is True
+        assert not mock_s3_service.get_file.called
+
+    @pytest.mark.asyncio
+    async def test_read_file_node_cached(self, mock_s3_service):
+        """Test that cached metadata is read from S3 once, until the file changes."""
+        service = S3FilesStore(s3_service=mock_s3_service, metadata_cache_enabled=True)
+        mock_s3_service.head_file.return_value = {
+            "ContentType": "text/plain",
+            "Metadata": {FILE_NODE_METADATA: '{"size":100,"is_file":true}'}
+        }
+        
+        first = await service._read_file_node("test.txt")
+        first.size = 0
+        second = await service._read_file_node("test.txt")
+        
+        assert second.size == 100
+        assert mock_s3_service.head_file.call_count == 1
+        assert not mock_s3_service.get_file.called
+        
+        # Deleting the file forgets its metadata, which delete_file reads from the cache
+        mock_s3_service.delete_file.return_value = "test.txt"
+        await service.delete_file("test.txt")
+        assert mock_s3_service.head_file.call_count == 1
+        await service._read_file_node("test.txt")
+        assert mock_s3_service.head_file.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_read_file_node_cache_expires(self, mock_s3_service):
+        """Test that cached metadata is read again from S3 once expired."""
+        service = S3FilesStore(s3_service=mock_s3_service, metadata_cache_enabled=True, metadata_cache_ttl_s=0)
+        mock_s3_service.head_file.return_value = {
+            "ContentType": "text/plain",
+            "Metadata": {FILE_NODE_METADATA: '{"size":100,"is_file":true}'}
+        }
+        
+        await service._read_file_node("test.txt")
+        await service._read_file_node("test.txt")
+        
+        assert mock_s3_service.head_file.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_read_file_node_from_json_file(self, s3_files_store, mock_s3_service):
+        """Test reading FileNode metadata from a JSON file in S3."""
+        mock_s3_service.head_file.return_value = {"ContentType": "text/plain", "Metadata": {}}
         # Mock metadata content
         mock_metadata = FileNode(
             name="test.txt",
@@ -725,11 +885,12 @@ class TestS3MetadataOperations:
     @pytest.mark.asyncio
     async def test_read_file_node_not_found(self, s3_files_store, mock_s3_service):
         """Test reading metadata when file doesn't exist."""
-        mock_s3_service.get_file.return_value = (False, False)
+        mock_s3_service.head_file.return_value = False
         
         result = await s3_files_store._read_file_node("nonexistent.txt")
         
         assert result is None
+        assert not mock_s3_service.get_file.called
 
     @pytest.mark.asyncio
     async def test_delete_file_node(self, s3_files_store, mock_s3_service):
@@ -739,12 +900,35 @@ class TestS3MetadataOperations:
         await s3_files_store._delete_file_node("test.txt")
         
         mock_s3_service.delete_file.assert_called_once_with(f"test.txt{s3_files_store.meta_extension}")
+
     @pytest.mark.asyncio
-    async def test_metadata_preserved_on_copy(self, s3_files_store, mock_s3_service):
-        """Test that metadata is preserved when copying a file."""
-        mock_s3_service.copy_file.return_value = "destination.txt"
+    async def test_metadata_preserved_on_copy(self, s3_files_store, mock_s3_service, spy):
+        """Test that metadata in a JSON file is preserved when copying a converted image."""
+        mock_s3_service.copy_file.return_value = "destination.webp"
         
         # Mock reading metadata
+        source_node = FileNode(
+            name="source.webp",
+            path="source.webp",
+            size=100,
+            mime_type="image/webp",
+            alt_name="source.png",
+            alt_path="source.png",
+            is_file=True
+        )
+        
+        spy.head.return_value = (source_node, True)
+        
+        await s3_files_store.copy_file("source.webp", "destination.webp")
+        
+        # Verify metadata was dumped for destination
+        assert spy.dump.called
+        mock_s3_service.copy_file.assert_called_once_with("source.webp", "destination.webp")
+
+    @pytest.mark.asyncio
+    async def test_metadata_migrated_on_copy(self, s3_files_store, mock_s3_service, spy):
+        """Test that metadata in a JSON file is moved to the object metadata when copying a file."""
+        mock_s3_service.copy_file.return_value = "destination.txt"
         source_node = FileNode(
             name="source.txt",
             path="source.txt",
@@ -753,16 +937,21 @@ class TestS3MetadataOperations:
             is_file=True
         )
         
-        with patch.object(s3_files_store, '_read_file_node', return_value=source_node):
-            with patch.object(s3_files_store, '_dump_file_node', new_callable=AsyncMock) as mock_dump:
-                await s3_files_store.copy_file("source.txt", "destination.txt")
-                
-                # Verify metadata was dumped for destination
-                assert mock_dump.called
+        spy.head.return_value = (source_node, True)
+        
+        result = await s3_files_store.copy_file("source.txt", "destination.txt")
+        
+        assert not spy.dump.called
+        
+        assert result is True
+        mock_s3_service.copy_file.assert_called_once_with(
+            "source.txt", "destination.txt",
+            metadata={FILE_NODE_METADATA: '{"size":100,"is_file":true}'},
+            mime_type="text/plain")
 
     @pytest.mark.asyncio
-    async def test_metadata_updated_on_move(self, s3_files_store, mock_s3_service):
-        """Test that metadata is updated when moving a file."""
+    async def test_metadata_updated_on_move(self, s3_files_store, mock_s3_service, spy):
+        """Test that metadata in a JSON file is updated when moving a file."""
         mock_s3_service.move_file.return_value = "destination.txt"
         
         # Mock operations
@@ -774,18 +963,21 @@ class TestS3MetadataOperations:
             is_file=True
         )
         
-        with patch.object(s3_files_store, '_read_file_node', return_value=source_node):
-            with patch.object(s3_files_store, '_dump_file_node', new_callable=AsyncMock) as mock_dump:
-                with patch.object(s3_files_store, '_delete_file_node', new_callable=AsyncMock) as mock_delete:
-                    await s3_files_store.move_file("source.txt", "destination.txt")
-                    
-                    # Verify metadata was updated and old one deleted
-                    assert mock_dump.called
-                    assert mock_delete.called
+        spy.head.return_value = (source_node, True)
+        
+        await s3_files_store.move_file("source.txt", "destination.txt")
+        
+        # Verify metadata was moved to the object and old file deleted
+        assert not spy.dump.called
+        spy.delete.assert_called_once_with("source.txt")
+        
+        kwargs = mock_s3_service.move_file.call_args.kwargs
+        assert json.loads(kwargs["metadata"][FILE_NODE_METADATA]) == {"size": 100, "is_file": True}
+        assert kwargs["mime_type"] == "text/plain"
 
     @pytest.mark.asyncio
-    async def test_metadata_deleted_with_file(self, s3_files_store, mock_s3_service):
-        """Test that metadata is deleted when file is deleted."""
+    async def test_metadata_deleted_with_file(self, s3_files_store, mock_s3_service, spy):
+        """Test that a metadata JSON file is deleted when file is deleted."""
         mock_s3_service.delete_file.return_value = "test.txt"
         mock_node = FileNode(
             name="test.txt",
@@ -794,9 +986,152 @@ class TestS3MetadataOperations:
             mime_type="text/plain",
             is_file=True
         )
-        with patch.object(s3_files_store, '_read_file_node', return_value=mock_node):
-            with patch.object(s3_files_store, '_delete_file_node', new_callable=AsyncMock) as mock_delete:
-                await s3_files_store.delete_file("test.txt")
+        spy.head.return_value = (mock_node, True)
+        
+        await s3_files_store.delete_file("test.txt")
             
         # Verify metadata was deleted
-        mock_delete.assert_called_once_with("test.txt")
+        spy.delete.assert_called_once_with("test.txt")
+
+
+class TestS3Service:
+    """Test suite for S3Service client handling."""
+
+    @pytest.mark.asyncio
+    async def test_open_shares_client(self):
+        """Test that an open service uses a single client for all requests."""
+        service = S3Service("http://localhost:9000", "key", "secret", "us-east-1", "test-bucket", "test-prefix")
+        client = MagicMock()
+        client.head_object = AsyncMock(return_value={"ResponseMetadata": {"HTTPStatusCode": 200}})
+        context = MagicMock()
+        context.__aenter__ = AsyncMock(return_value=client)
+        context.__aexit__ = AsyncMock(return_value=False)
+        
+        with patch.object(service, '_create_client', return_value=context) as mock_create:
+            async with service:
+                assert await service.path_exists("a.txt") is True
+                assert await service.path_exists("b.txt") is True
+            
+            assert mock_create.call_count == 1
+            assert client.head_object.call_count == 2
+            assert context.__aexit__.called
+
+    @pytest.mark.asyncio
+    async def test_copy_file_replaces_metadata(self):
+        """Test that a copy with metadata replaces the object metadata server-side."""
+        service = S3Service("http://localhost:9000", "key", "secret", "us-east-1", "test-bucket", "test-prefix")
+        client = MagicMock()
+        client.copy_object = AsyncMock(return_value={"ResponseMetadata": {"HTTPStatusCode": 200}})
+        context = MagicMock()
+        context.__aenter__ = AsyncMock(return_value=client)
+        context.__aexit__ = AsyncMock(return_value=False)
+        
+        with patch.object(service, '_create_client', return_value=context):
+            result = await service.copy_file("a.txt", "b.txt", metadata={"file-node": "{}"}, mime_type="text/plain")
+        
+        assert result == "test-prefix/b.txt"
+        kwargs = client.copy_object.call_args.kwargs
+        assert kwargs["CopySource"] == {"Bucket": "test-bucket", "Key": "test-prefix/a.txt"}
+        assert kwargs["MetadataDirective"] == "REPLACE"
+        assert kwargs["Metadata"] == {"file-node": "{}"}
+        assert kwargs["ContentType"] == "text/plain"
+
+
+@pytest.fixture(scope="module")
+def moto_endpoint():
+    """Start an in-process S3 server, when moto is installed."""
+    moto_server = pytest.importorskip("moto.server")
+    server = moto_server.ThreadedMotoServer(port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture
+async def moto_s3_service(moto_endpoint):
+    """Create an S3Service on a new bucket of the in-process S3 server."""
+    service = S3Service(moto_endpoint, "testing", "testing", "us-east-1", f"test-bucket-{uuid4().hex}", "test-prefix")
+    async with service:
+        async with service._client() as client:
+            await client.create_bucket(Bucket=service.bucket)
+        yield service
+
+
+class TestS3FilesStoreWithServer:
+    """Test suite for S3FilesStore against an in-process S3 server."""
+
+    async def test_file_lifecycle(self, moto_s3_service):
+        """Test writing, listing, copying, moving and deleting files."""
+        store = S3FilesStore(s3_service=moto_s3_service)
+        content = b"Server content"
+        upload_file = UploadFile(
+            filename="test.txt",
+            file=BytesIO(content),
+            headers=Headers({'content-type': 'text/plain'})
+        )
+        
+        node = await store.write_file(upload_file, folder="docs")
+        assert node.path == "docs/test.txt"
+        assert node.size == len(content)
+        
+        # No metadata file, the node is in the object metadata
+        keys = await moto_s3_service.list_files("")
+        assert keys == ["test-prefix/docs/test.txt"]
+        
+        listed = await store.list_files("docs")
+        assert [(n.name, n.path, n.size, n.mime_type) for n in listed] == [
+            ("test.txt", "docs/test.txt", len(content), "text/plain")]
+        
+        assert await store.copy_file("docs/test.txt", "docs/copy.txt") is True
+        assert await store.move_file("docs/copy.txt", "other/moved.txt") is True
+        moved = await store._read_file_node("other/moved.txt")
+        assert (moved.name, moved.path, moved.size) == ("moved.txt", "other/moved.txt", len(content))
+        
+        retrieved, mime_type = await store.get_file("other/moved.txt")
+        assert retrieved == content
+        assert mime_type == "text/plain"
+        
+        assert await store.delete_file("other/moved.txt") is True
+        assert await store.file_exists("other/moved.txt") is False
+        assert await store.file_exists("docs/copy.txt") is False
+        assert await store.file_exists("docs/test.txt") is True
+
+    async def test_overwrite_legacy_metadata_file(self, moto_s3_service):
+        """Test that overwriting a file with a legacy metadata file removes the stale JSON file."""
+        store = S3FilesStore(s3_service=moto_s3_service)
+        legacy = FileNode(name="test.txt", path="docs/test.txt", size=3, mime_type="text/plain", is_file=True)
+        async with moto_s3_service._client() as client:
+            await client.put_object(Bucket=moto_s3_service.bucket, Key="test-prefix/docs/test.txt", Body=b"old")
+            await client.put_object(
+                Bucket=moto_s3_service.bucket,
+                Key=f"test-prefix/docs/test.txt{store.meta_extension}",
+                Body=legacy.model_dump_json().encode("utf-8"))
+
+        content = b"Server content, updated"
+        upload_file = UploadFile(
+            filename="test.txt",
+            file=BytesIO(content),
+            headers=Headers({'content-type': 'text/plain'})
+        )
+        await store.write_file(upload_file, folder="docs")
+
+        assert await moto_s3_service.list_files("") == ["test-prefix/docs/test.txt"]
+        listed = await store.list_files("docs")
+        assert [(n.name, n.size) for n in listed] == [("test.txt", len(content))]
+
+        assert await store.delete_file("docs/test.txt") is True
+        assert await moto_s3_service.list_files("") == []
+
+    async def test_list_files_parallel(self, moto_s3_service):
+        """Test that a sharded listing returns the same keys as a sequential one."""
+        names = ["0", "A", "a", "a.txt", "b/c.txt", "z", "~tilde", "Ω.txt", "docs/x.txt"]
+        async with moto_s3_service._client() as client:
+            for name in names:
+                await client.put_object(Bucket=moto_s3_service.bucket, Key=f"test-prefix/data/{name}", Body=b"x")
+            await client.put_object(Bucket=moto_s3_service.bucket, Key="test-prefix/data2/other.txt", Body=b"x")
+        
+        keys = await moto_s3_service.list_files("data")
+        assert len(keys) == len(names) + 1
+        for num_shards in (1, 4, 16, 100):
+            assert await moto_s3_service.list_files_parallel("data", num_shards=num_shards) == keys